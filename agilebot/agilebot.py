@@ -2,20 +2,41 @@ __author__ = 'ntrepid8'
 import requests
 import logging
 from logging import NullHandler
+import hashlib
 import json
 from fnmatch import fnmatch
-from datetime import date
-from agilebot import util
+from agilebot import defaults, util
+from agilebot.defaults import DEFAULT_SPRINT_NAME_TPL
 from agilebot.trello.bot import TrelloBot
+from agilebot.trello import sync
 from agilebot.slack.bot import SlackBot
+from agilebot.store import BoardStore
 import os
+import threading
 logger = logging.getLogger('agilebot.lib')
 logger.addHandler(NullHandler())
 TRELLO_API_BASE_URL = 'https://api.trello.com/1'
-DEFAULT_SPRINT_NAME_TPL = 'Sprint {iso_year}.{iso_week}'
+# seconds to wait for the status of a webhook receiver
+WEBHOOK_STATUS_TIMEOUT = 1
 
+# fields of a migrated card kept in its migration result, the whole cards go to the local store in chunks
+MIGRATED_CARD_FIELDS = ['id', 'idBoard', 'idList']
+MIGRATED_CARDS_CHUNK_SIZE = 100
 
-class AgileBot(object):
+# fields of the closing sprint board used by a rollover
+ROLLOVER_FIELDS = {
+    'board': ['name'],
+    'lists': ['name'],
+    'cards': ['idList'],
+    'members': ['username']
+}
+
+
+class AgileBotBase(object):
+    """ Sprint bookkeeping shared by :class:`AgileBot` and the asyncio `AsyncAgileBot`: configuration, sprint files,
+    naming and rollover planning, none of which talks to Trello by itself.
+    """
+    trello_class = None
 
     def __init__(self, **kwargs):
 
@@ -27,212 +48,516 @@ class AgileBot(object):
 
         # trello
         try:
-            self.trello = TrelloBot(kwargs.get('trello'))
+            self.trello = self.trello_class(kwargs.get('trello'))
         except Exception as e:
             raise ValueError('trello {}'.format(e))
 
         # slack
         self.slack = SlackBot(kwargs.get('slack'))
 
+        # local store
+        self.store = BoardStore(self.conf['store']['path'])
+
     @classmethod
     def default_conf(cls):
-        # Agilebot environment variables
-        ab_base_path = os.environ.get(
-            'AB_BASE_PATH',
-            '~/.agilebot.d'
-        )
-        ab_base_path = os.path.expanduser(ab_base_path)
-        ab_active_sprint_path = os.environ.get(
-            'AB_ACTIVE_SPRINT_PATH',
-            '{base_path}/sprint_active.json'.format(
-                base_path=ab_base_path)
-        )
-        ab_closing_sprint_path = os.environ.get(
-            'AB_CLOSING_SPRINT_PATH',
-            '{base_path}/sprint_closing.json'.format(
-                base_path=ab_base_path)
-        )
-
-        return {
-            'agile': {
-                'backlogs': [],
-                'sprint_lists': ['To Do', 'In Progress', 'Completed', 'Deployed'],
-                'sprint_lists_forward': ['To Do', 'In Progress']
-            },
-            'logging': {
-                'level': 'INFO'
-            },
-            'sprint': {
-                'name_tpl': DEFAULT_SPRINT_NAME_TPL,
-                'active_sprint_path': ab_active_sprint_path,
-                'closing_sprint_path': ab_closing_sprint_path,
-            },
-            'slack': SlackBot.default_conf(),
-            'trello': TrelloBot.default_conf(),
-        }
+        return defaults.agilebot_conf()
 
     def log_http(self, resp):
         util.log_request_response(resp, logger)
 
     def format_sprint_name(self, sprint_name=None, iso_year=None, iso_week=None):
-        sprint_name = sprint_name or DEFAULT_SPRINT_NAME_TPL
-        iso_date = date.today().isocalendar()
-        sn_kwargs = dict(
-            iso_year=iso_year or iso_date[0],
-            iso_week=iso_week or iso_date[1]
-        )
-        return sprint_name.format(**sn_kwargs)
+        return util.format_sprint_name(sprint_name, iso_year=iso_year, iso_week=iso_week)
+
+    def load_sprint(self, sprint_path):
+        if not os.path.exists(sprint_path):
+            return None
+        with open(sprint_path) as f:
+            return json.load(f)
+
+    def save_sprint(self, sprint_path, sprint):
+        # replace the file in one go, other processes may be reading it
+        tmp_path = '{}.{}.{}.tmp'.format(sprint_path, os.getpid(), threading.get_ident())
+        with open(tmp_path, 'w') as f:
+            json.dump(sprint, f, indent=4, sort_keys=True)
+        os.replace(tmp_path, sprint_path)
+
+        # keep the local store up to date with the boards we have seen
+        board = sprint.get('trello_board')
+        if board and 'cards' in board:
+            self.store_board(board)
+
+    def store_board(self, board):
+        try:
+            self.store.save_board(board)
+        except Exception as e:
+            logger.warning('unable to store board {}: {}({})'.format(board['id'], type(e).__name__, e))
+
+    def new_sprint(self, sprint_name=None, sprint_list_names=None):
+        new_sprint = {
+            'name': self.format_sprint_name(sprint_name or DEFAULT_SPRINT_NAME_TPL),
+            'lists': sprint_list_names or self.agile.sprint_lists,
+            'trello_board': None
+        }
+
+        # mark the new sprint as the active sprint
+        if 'active' not in new_sprint['name']:
+            new_sprint['name'] += ' (active)'
+        return new_sprint
+
+    def sprint_from_board(self, board, sprint_name=None):
+        return {
+            'name': sprint_name or board['name'],
+            'lists': [l['name'] for l in board['lists']],
+            'trello_board': board
+        }
+
+    def closing_sprint_from_boards(self, closing_sprint_name, boards):
+        """ The closing sprint from the boards found for `closing_sprint_name`, which must be exactly one board
+        that loaded without error.
+        """
+        for board in boards:
+            if 'error' in board:
+                raise ValueError('nothing migrated: unable to get board {} ({}): {}'.format(
+                    board['id'], board.get('name'), board['error']))
+        if len(boards) == 0:
+            raise ValueError('nothing migrated: closing_sprint_name not found: {}'.format(closing_sprint_name))
+        elif len(boards) > 1:
+            raise ValueError('nothing migrated: ambiguous closing_sprint_name: {}, found {} boards matching'.format(
+                closing_sprint_name, len(boards)
+            ))
+        return self.sprint_from_board(boards[0])
+
+    def closing_sprint_name(self, sprint_name):
+        csn = sprint_name
+        if 'active' in csn:
+            csn = csn.replace('active', 'closing')
+        if 'closing' not in csn:
+            csn += ' (closing)'
+        return csn
+
+    def sprint_members(self, closing_sprint):
+        if closing_sprint and closing_sprint.get('trello_board'):
+            return closing_sprint['trello_board'].get('members') or []
+        return []
+
+    def list_moves(self, closing_sprint, new_sprint):
+        """ Yield `(list_id, target_list_id)` for every list to forward from the closing sprint to the new sprint.
+        """
+        lists_forward_targets = {l['name']: l for l in new_sprint['trello_board']['lists']}
+        for l in closing_sprint['trello_board']['lists']:
+            if l['name'] in self.agile.sprint_lists_forward:
+                yield l['id'], lists_forward_targets[l['name']]['id']
+
+    def card_moves(self, closing_sprint, new_sprint, card_filter=None, list_ids=None):
+        """ Yield `(card_id, update)` for every card to forward from the closing sprint to the new sprint.
+
+        If `card_filter` is given only the cards for which it returns True are forwarded, if `list_ids` is given
+        only the cards in those lists are forwarded.
+        """
+        lists_forward = dict(self.list_moves(closing_sprint, new_sprint))
+        if list_ids is not None:
+            lists_forward = {k: v for k, v in lists_forward.items() if k in list_ids}
+
+        for c in self.closing_cards(closing_sprint['trello_board'], card_filter=card_filter):
+            if c['idList'] in lists_forward and (card_filter is None or card_filter(c)):
+                update_c = {
+                    'idList': lists_forward[c['idList']],
+                    'idBoard': new_sprint['trello_board']['id']
+                }
+                yield c['id'], update_c
+
+    def closing_cards(self, closing_board, card_filter=None):
+        """ Cards of the closing sprint board, which must have been fetched with its cards.
+        """
+        return closing_board['cards']
+
+    def migration_result(self, card_id, card=None, error=None):
+        if error is not None:
+            logger.warning('unable to migrate card {}: {}({})'.format(card_id, type(error).__name__, error))
+            return {'id': card_id, 'success': False, 'card': None, 'error': '{}: {}'.format(type(error).__name__, error)}
+
+        # only keep where the card went, not the whole card
+        if card is not None:
+            card = {k: card.get(k) for k in MIGRATED_CARD_FIELDS}
+        return {'id': card_id, 'success': True, 'card': card, 'error': None}
+
+    def store_cards(self, cards):
+        """ Add migrated cards to the local store.
+        """
+        try:
+            self.store.save_cards(cards)
+        except Exception as e:
+            logger.warning('unable to store {} migrated cards: {}({})'.format(len(cards), type(e).__name__, e))
+
+    def log_migration_progress(self, done, total, result):
+        logger.debug('migrated card {} ({}/{}): {}'.format(
+            result['id'], done, total or '?', 'ok' if result['success'] else result['error']))
+        if done == total or done % max((total or 1000) // 10, 1) == 0:
+            logger.info('migrating cards: {}/{}'.format(done, total or '?'))
+
+    def rollover_fields(self, card_filter=None):
+        """ Fields to request for the closing sprint board, a `card_filter` may need any card field.
+        """
+        fields = dict(ROLLOVER_FIELDS)
+        if card_filter is not None:
+            del fields['cards']
+        return fields
+
+
+class AgileBot(AgileBotBase):
+    trello_class = TrelloBot
+
+    def closing_cards(self, closing_board, card_filter=None):
+        """ Cards of the closing sprint board, streamed from trello page by page when the board was fetched without
+        its cards.
+        """
+        if 'cards' in closing_board:
+            return closing_board['cards']
+        return self.trello.iter_cards(
+            closing_board['id'], fields=None if card_filter else self.rollover_fields()['cards'])
+
+    def current_member_id(self):
+        """ Id of the trello member agilebot acts as, looked up once per oauth token and then read from the local
+        store.
+        """
+        token_hash = hashlib.sha256((self.trello.conf.oauth_token or '').encode('utf-8')).hexdigest()
+        member_id = self.store.get_token_member(token_hash)
+        if member_id is None:
+            member = self.trello.get_current_member()
+            self.store.save_token_member(token_hash, member)
+            member_id = member['id']
+        return member_id
+
+    def refresh_sprint(self, sprint_path, sprint):
+        """ Update the trello board of a sprint loaded from `sprint_path`.
+
+        With the freshness check enabled, only the board's `dateLastActivity` is fetched at first: the stored board
+        is reused when nothing changed since it was saved, otherwise the full board is fetched and saved. A board
+        saved without its cards, as a rollover leaves it, is never reused.
+        """
+        board_id = sprint['trello_board']['id']
+        if self.sprint_is_live(sprint):
+            logger.debug('board {} kept up to date by webhook {}'.format(board_id, sprint['webhook']['id']))
+            return sprint
+
+        if not self.conf['sprint']['freshness_check']:
+            sprint['trello_board'] = self.trello.get_board(board_id)
+            return sprint
+
+        stored_activity = sprint['trello_board'].get('dateLastActivity')
+        if 'cards' in sprint['trello_board']:
+            last_activity = self.trello.get_board_activity(board_id)
+            if last_activity is not None and last_activity == stored_activity:
+                logger.debug('board {} unchanged since {}, using the stored board'.format(board_id, last_activity))
+                return sprint
+
+        logger.debug('board {} changed since {}, getting the full board'.format(board_id, stored_activity))
+        sprint['trello_board'] = self.trello.get_board(board_id)
+        self.save_sprint(sprint_path, sprint)
+        return sprint
+
+    def sprint_is_live(self, sprint):
+        """ True if a running webhook receiver (`agilebot sprint webhook`) keeps the sprint's board up to date.
+
+        The receiver is asked for its status on the local address it serves, so a receiver that is gone is never
+        mistaken for a live one, whatever process took its place.
+        """
+        webhook = sprint.get('webhook')
+        if not webhook or not webhook.get('status_url'):
+            return False
+        try:
+            resp = requests.get(webhook['status_url'], timeout=WEBHOOK_STATUS_TIMEOUT)
+            status = resp.json()
+        except (requests.RequestException, ValueError):
+            return False
+        return resp.status_code == requests.codes.ok and status.get('instance') == webhook.get('instance')
+
+    def apply_board_action(self, board_id, action):
+        """ Apply a trello action, e.g. received by a webhook, to the stored board of the active or closing sprint.
+
+        Actions older than the last action applied to the board are ignored, so webhook deliveries can overlap a
+        sync.
+
+        :return: path of the updated sprint, or None if no sprint uses the board
+        :rtype: str
+        """
+        for sprint_path in (self.conf['sprint']['active_sprint_path'], self.conf['sprint']['closing_sprint_path']):
+            sprint = self.load_sprint(sprint_path)
+            if sprint is None or (sprint.get('trello_board') or {}).get('id') != board_id:
+                continue
+            if 'cards' not in sprint['trello_board']:
+                # nothing to apply the action to, the next sync gets the full board
+                logger.debug('ignoring action {} for board {} stored without its cards'.format(action['id'], board_id))
+                return sprint_path
+            last_action_id = sprint.get('last_action_id')
+            if last_action_id is not None and action['id'] <= last_action_id:
+                logger.debug('ignoring action {} already applied to board {}'.format(action['id'], board_id))
+                return sprint_path
+            sync.apply_actions(sprint['trello_board'], [action])
+            sprint['last_action_id'] = action['id']
+            self.save_sprint(sprint_path, sprint)
+            return sprint_path
+        return None
 
     def get_active_sprint(self):
-        if not os.path.exists(self.conf['sprint']['active_sprint_path']):
+        active_sprint = self.load_sprint(self.conf['sprint']['active_sprint_path'])
+        if active_sprint is None:
             raise ValueError('active sprint not found at: {}'.format(self.conf['sprint']['active_sprint_path']))
-        with open(self.conf['sprint']['active_sprint_path']) as f:
-            active_sprint = json.load(f)
 
         # update the trello board
-        active_sprint['trello_board'] = self.trello.get_board(active_sprint['trello_board']['id'])
-        return active_sprint
+        return self.refresh_sprint(self.conf['sprint']['active_sprint_path'], active_sprint)
 
     def get_closing_sprint(self):
-        if not os.path.exists(self.conf['sprint']['closing_sprint_path']):
+        closing_sprint = self.load_sprint(self.conf['sprint']['closing_sprint_path'])
+        if closing_sprint is None:
             raise ValueError('closing sprint not found at: {}'.format(self.conf['sprint']['closing_sprint_path']))
-        with open(self.conf['sprint']['closing_sprint_path']) as f:
-            closing_sprint = json.load(f)
 
         # update the trello board
-        closing_sprint['trello_board'] = self.trello.get_board(closing_sprint['trello_board']['id'])
-        return closing_sprint
+        return self.refresh_sprint(self.conf['sprint']['closing_sprint_path'], closing_sprint)
+
+    def sync_sprint(self, sprint_path=None):
+        """ Bring the trello board stored for a sprint up to date by applying the board's actions since the last
+        sync, so the cost scales with the amount of change instead of the size of the board.
+
+        The first sync of a sprint fetches the full board and records the latest action id.
+
+        :param sprint_path: path of the sprint file, the active sprint by default
+        :return: the updated sprint, also saved to `sprint_path`
+        :rtype: dict
+        """
+        sprint_path = sprint_path or self.conf['sprint']['active_sprint_path']
+        sprint = self.load_sprint(sprint_path)
+        if sprint is None:
+            raise ValueError('sprint not found at: {}'.format(sprint_path))
+        board_id = sprint['trello_board']['id']
+
+        last_action_id = sprint.get('last_action_id')
+        if last_action_id is None or 'cards' not in sprint['trello_board']:
+            # get the latest action first so nothing that happens while getting the board is missed
+            latest = self.trello.get_board_actions(board_id, action_types=sync.SYNC_ACTION_TYPES, limit=1)
+            sprint['trello_board'] = self.trello.get_board(board_id)
+            if latest:
+                sprint['last_action_id'] = latest[-1]['id']
+            logger.debug('synced full board {}'.format(board_id))
+        else:
+            actions = self.trello.get_board_actions(
+                board_id, since=last_action_id, action_types=sync.SYNC_ACTION_TYPES)
+            sync.apply_actions(sprint['trello_board'], actions)
+            if actions:
+                sprint['last_action_id'] = actions[-1]['id']
+            logger.debug('synced board {}: {} actions'.format(board_id, len(actions)))
+
+        self.save_sprint(sprint_path, sprint)
+        return sprint
+
+    def get_sprints(self):
+        """ Get the active and closing sprints, updating their trello boards like `refresh_sprint` but with the
+        freshness checks of both boards, then the boards that changed, fetched with a single batch request each.
+
+        :return: `{'active': sprint, 'closing': sprint}`, a sprint is None if it was not found
+        :rtype: dict
+        """
+        paths = {
+            'active': self.conf['sprint']['active_sprint_path'],
+            'closing': self.conf['sprint']['closing_sprint_path']
+        }
+        sprints = {k: self.load_sprint(path) for k, path in paths.items()}
+        stale = [k for k, s in sprints.items() if s is not None and not self.sprint_is_live(s)]
+
+        # only get the boards that changed since they were saved, or were saved without their cards
+        checked = [k for k in stale if 'cards' in sprints[k]['trello_board']]
+        if checked and self.conf['sprint']['freshness_check']:
+            activity = self.trello.batch([
+                '/boards/{board_id}?fields=dateLastActivity'.format(board_id=sprints[k]['trello_board']['id'])
+                for k in checked
+            ])
+            unchanged = [
+                k for k, (board, err) in zip(checked, activity)
+                if err is None and board['dateLastActivity'] == sprints[k]['trello_board'].get('dateLastActivity')
+            ]
+            stale = [k for k in stale if k not in unchanged]
+
+        boards = self.trello.get_boards([sprints[k]['trello_board']['id'] for k in stale])
+        for k, board in zip(stale, boards):
+            sprints[k]['trello_board'] = board
+            self.save_sprint(paths[k], sprints[k])
+        return sprints
+
+    def migrate_cards(self, moves, max_workers=None, progress=None):
+        """ Apply card moves in parallel, using at most `max_workers` concurrent requests.
+
+        The moves are consumed as they complete, so a generator such as `card_moves` streaming the cards of the
+        closing board is never held in memory as a whole.
+
+        :param moves: iterable of `(card_id, update)` tuples, as produced by `card_moves`
+        :param max_workers: maximum number of concurrent requests (defaults to the trello `max_workers`)
+        :type max_workers: int
+        :param progress: callable receiving `(done, total, result)` as each card completes, `total` is None unless
+                         `moves` has a length
+        :return: list of `{'id', 'success', 'card', 'error'}` results in the same order as `moves`, see
+                 `migration_result`
+        :rtype: list
+        """
+        total = len(moves) if hasattr(moves, '__len__') else None
+        progress = progress or self.log_migration_progress
+
+        def move(m):
+            card_id, update_c = m
+            try:
+                card = self.trello.update_card(card_id, update_c)
+            except Exception as e:
+                return self.migration_result(card_id, error=e), None
+            return self.migration_result(card_id, card=card), card
+
+        results = []
+        to_store = []
+        moved = util.iter_bounded(move, moves, max_workers=max_workers or self.trello.conf.max_workers)
+        for done, ((result, card), _) in enumerate(moved, 1):
+            results.append(result)
+            progress(done, total, result)
+            if card is not None:
+                to_store.append(card)
+            if len(to_store) >= MIGRATED_CARDS_CHUNK_SIZE:
+                self.store_cards(to_store)
+                to_store = []
+        if to_store:
+            self.store_cards(to_store)
+        return results
+
+    def rollover_cards(self, closing_sprint, new_sprint, card_filter=None):
+        """ Forward the open cards from the closing sprint to the new sprint.
+
+        With the "lists" rollover strategy every forwarded list is moved with a single request, falling back to
+        per-card moves for a list that could not be moved, or when a `card_filter` is given.
+
+        :return: list of per-card results, see `migrate_cards`
+        :rtype: list
+        """
+        if card_filter is not None or self.agile.rollover_strategy != 'lists':
+            return self.migrate_cards(self.card_moves(closing_sprint, new_sprint, card_filter=card_filter))
+
+        list_moves = list(self.list_moves(closing_sprint, new_sprint))
+        moved_lists = util.map_bounded(
+            lambda m: self.trello.move_all_cards(m[0], new_sprint['trello_board']['id'], m[1]),
+            list_moves,
+            max_workers=self.trello.conf.max_workers
+        )
+        results = []
+        fallback_list_ids = []
+        for (list_id, _), (cards, err) in zip(list_moves, moved_lists):
+            if err is not None:
+                logger.warning('unable to move all cards from list {}, moving them one at a time: {}({})'.format(
+                    list_id, type(err).__name__, err))
+                fallback_list_ids.append(list_id)
+                continue
+            logger.info('moved {} cards from list {}'.format(len(cards), list_id))
+            results.extend(self.migration_result(c['id'], card=c) for c in cards)
+            self.store_cards(cards)
+
+        if fallback_list_ids:
+            results.extend(self.migrate_cards(self.card_moves(
+                closing_sprint, new_sprint, list_ids=fallback_list_ids)))
+        return results
 
     def start_new_sprint(self,
                          sprint_name=None,
                          sprint_list_names=None,
                          organization_id=None,
                          close_active_sprint=True,
-                         closing_sprint_name=None):
-        #
-        # create a new sprint
-        new_sprint = {
-            'name': self.format_sprint_name(sprint_name or DEFAULT_SPRINT_NAME_TPL),
-            'lists': sprint_list_names or self.agile.sprint_lists,
-            'trello_board': None
-        }
+                         closing_sprint_name=None,
+                         card_filter=None):
+        """ Create the board of a new sprint and forward the open cards of the closing sprint to it.
 
-        # mark the new sprint as the active sprint
-        if 'active' not in new_sprint['name']:
-            new_sprint['name'] += ' (active)'
+        The board of the returned (and saved) new sprint never has `cards`: the migrated cards go to the local store
+        and are reported in `migrated_cards`, and the full board is fetched the next time the sprint is read.
+
+        :return: the new sprint, with `migrated_cards` when cards were migrated, see `migrate_cards`
+        :rtype: dict
+        """
+        # repeated reads during the rollover reuse the responses until something changes
+        with self.trello.request_scope(), self.trello.call_budget(
+                'sprint rollover', self.conf['sprint']['rollover_call_budget']):
+            #
+            # create a new sprint
+            new_sprint = self.new_sprint(sprint_name, sprint_list_names)
 
-        # load the currently active sprint (to become the closing sprint)
-        if close_active_sprint is True:
-            if os.path.exists(self.conf['sprint']['active_sprint_path']):
-                with open(self.conf['sprint']['active_sprint_path']) as f:
-                    closing_sprint = json.load(f)
-                closing_sprint['trello_board'] = self.trello.get_board(closing_sprint['trello_board']['id'])
+            # load the currently active sprint (to become the closing sprint)
+            if close_active_sprint is True:
+                closing_sprint = self.load_sprint(self.conf['sprint']['active_sprint_path'])
+                if closing_sprint is not None:
+                    closing_sprint['trello_board'] = self.trello.get_board(
+                        closing_sprint['trello_board']['id'], cards='none', fields=self.rollover_fields(card_filter))
+            elif closing_sprint_name is not None:
+                resp = self.trello.find_boards(
+                    board_name=closing_sprint_name,
+                    cards='none',
+                    organization_id=organization_id,
+                    fields=self.rollover_fields(card_filter)
+                )
+                closing_sprint = self.closing_sprint_from_boards(closing_sprint_name, resp)
             else:
                 closing_sprint = None
-        elif closing_sprint_name is not None:
-            resp = self.trello.find_boards(board_name=closing_sprint_name, organization_id=organization_id)
-            if len(resp) == 0:
-                raise ValueError('nothing migrated: closing_sprint_name not found: {}'.format(closing_sprint_name))
-            elif len(resp) > 1:
-                raise ValueError('nothing migrated: ambiguous closing_sprint_name: {}, found {} boards matching'.format(
-                    closing_sprint_name, len(resp)
+
+            # compute members
+            members = self.sprint_members(closing_sprint)
+
+            # create a trello board for the sprint
+            try:
+                trello_board = self.trello.create_board(
+                    board_name=new_sprint['name'],
+                    list_names=new_sprint['lists'],
+                    organization_id=organization_id,
+                    members=members
+                )
+            except Exception as e:
+                logger.debug('while running trello.create_board agilebot.create_sprint caught: {}({})'.format(
+                    type(e).__name__, e
                 ))
+                raise e
             else:
-                closing_sprint_board = resp[0]
-                closing_sprint = {
-                    'name': closing_sprint_board['name'],
-                    'lists': [l['name'] for l in closing_sprint_board['lists']],
-                    'trello_board': closing_sprint_board
-                }
-        else:
-            closing_sprint = None
+                new_sprint['trello_board'] = trello_board
+            logger.debug('created new sprint board: {}'.format(trello_board['name']))
 
-        # compute members
-        if closing_sprint and closing_sprint.get('trello_board'):
-            members = closing_sprint['trello_board'].get('members') or []
-        else:
-            members = []
+            # the migrated cards are added to the stored board as they move, but not kept in memory
+            self.store_board(trello_board)
+            trello_board.pop('cards', None)
 
-        # create a trello board for the sprint
-        try:
-            trello_board = self.trello.create_board(
-                board_name=new_sprint['name'],
-                list_names=new_sprint['lists'],
-                organization_id=organization_id,
-                members=members
-            )
-        except Exception as e:
-            logger.debug('while running trello.create_board agilebot.create_sprint caught: {}({})'.format(
-                type(e).__name__, e
-            ))
-            raise e
-        else:
-            new_sprint['trello_board'] = trello_board
-        logger.debug('created new sprint board: {}'.format(trello_board['name']))
-
-        # update the name of the closing sprint
-        if closing_sprint is not None:
-            csn = closing_sprint['name']
-            if 'active' in csn:
-                csn = csn.replace('active', 'closing')
-            if 'closing' not in csn:
-                csn += ' (closing)'
-            closing_sprint_board = self.trello.update_board(
-                board_id=closing_sprint['trello_board']['id'],
-                data={'name': csn}
-            )
-            logger.debug('updated closing sprint name to: {}'.format(closing_sprint_board['name']))
-
-            # save the old (closing) sprint
-            closing_sprint = {
-                'name': csn,
-                'lists': [l['name'] for l in closing_sprint_board['lists']],
-                'trello_board': closing_sprint_board
-            }
-            with open(self.conf['sprint']['closing_sprint_path'], 'w') as f:
-                json.dump(closing_sprint, f, indent=4, sort_keys=True)
-
-        # save the new (active) sprint
-        with open(self.conf['sprint']['active_sprint_path'], 'w') as f:
-            json.dump(new_sprint, f, indent=4, sort_keys=True)
-
-        # if not migrating from a sprint that is closing, we are all done
-        if closing_sprint is None:
-            return new_sprint
+            # update the name of the closing sprint
+            if closing_sprint is not None:
+                csn = self.closing_sprint_name(closing_sprint['name'])
+                closing_sprint_board = self.trello.update_board(
+                    board_id=closing_sprint['trello_board']['id'],
+                    data={'name': csn},
+                    board=closing_sprint['trello_board']
+                )
+                logger.debug('updated closing sprint name to: {}'.format(closing_sprint_board['name']))
 
-        #
-        # migrate from the closing sprint
+                # save the old (closing) sprint, its board has no cards so it is fetched in full when next read
+                closing_sprint = self.sprint_from_board(closing_sprint_board, sprint_name=csn)
+                self.save_sprint(self.conf['sprint']['closing_sprint_path'], closing_sprint)
 
-        # lists to forward
-        closing_lists = closing_sprint['trello_board']['lists']
-        lists_forward = [l for l in closing_lists if l['name'] in self.agile.sprint_lists_forward]
-        lists_forward = {l['id']: l for l in lists_forward}
-        lists_forward_targets = {l['name']: l for l in new_sprint['trello_board']['lists']}
+            # save the new (active) sprint
+            self.save_sprint(self.conf['sprint']['active_sprint_path'], new_sprint)
 
-        # migrate cards
-        migrated_cards = []
-        for c in closing_sprint['trello_board']['cards']:
-            if c['idList'] in lists_forward:
-                old_list_id = c['idList']
-                list_name = lists_forward[old_list_id]['name']
-                new_list_id = lists_forward_targets[list_name]['id']
-                update_c = {
-                    'idList': new_list_id,
-                    'idBoard': new_sprint['trello_board']['id']
-                }
-                updated_c = self.trello.update_card(c['id'], update_c)
-                migrated_cards.append(updated_c)
-        logger.debug('migrated cards: {}'.format(len(migrated_cards)))
+            # if not migrating from a sprint that is closing, we are all done
+            if closing_sprint is None:
+                return new_sprint
 
-        # get the updated trello board
-        new_sprint['trello_board'] = self.trello.get_board(new_sprint['trello_board']['id'])
+            #
+            # migrate from the closing sprint
 
-        # save the new sprint (since we may have added cards)
-        with open(self.conf['sprint']['active_sprint_path'], 'w') as f:
-            json.dump(new_sprint, f, indent=4, sort_keys=True)
+            # migrate cards
+            migrated_cards = self.rollover_cards(closing_sprint, new_sprint, card_filter=card_filter)
+            failed_cards = [r for r in migrated_cards if not r['success']]
+            logger.debug('migrated cards: {}'.format(len(migrated_cards) - len(failed_cards)))
+            if failed_cards:
+                logger.warning('failed to migrate {} of {} cards'.format(len(failed_cards), len(migrated_cards)))
 
-        # log it
-        logger.info('successfully started new sprint: {}'.format(new_sprint['trello_board']['name']))
+            # log it
+            logger.info('successfully started new sprint: {}'.format(new_sprint['trello_board']['name']))
 
-        # all done!
-        return new_sprint
+            # report the per-card migration results
+            new_sprint['migrated_cards'] = migrated_cards
+
+            # all done!
+            return new_sprint
@@ -0,0 +1,171 @@
+__author__ = 'ntrepid8'
+import asyncio
+import logging
+from logging import NullHandler
+from agilebot.agilebot import AgileBotBase
+from agilebot.trello.async_bot import AsyncTrelloBot
+logger = logging.getLogger('agilebot.lib')
+logger.addHandler(NullHandler())
+
+
+class AsyncAgileBot(AgileBotBase):
+    """ asyncio version of :class:`AgileBot`, driving Trello through an :class:`AsyncTrelloBot`.
+
+    The sprint methods are coroutines; configuration, sprint files and naming are shared with :class:`AgileBot`
+    through :class:`AgileBotBase`. Incremental sync, webhooks and batched sprint reads are only available on
+    :class:`AgileBot`.
+    """
+    trello_class = AsyncTrelloBot
+
+    async def close(self):
+        await self.trello.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def load_sprint(self, sprint_path):
+        return await asyncio.get_running_loop().run_in_executor(None, super().load_sprint, sprint_path)
+
+    async def save_sprint(self, sprint_path, sprint):
+        # the file write and the sqlite store are blocking IO, keep them off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, super().save_sprint, sprint_path, sprint)
+
+    async def get_active_sprint(self):
+        active_sprint = await self.load_sprint(self.conf['sprint']['active_sprint_path'])
+        if active_sprint is None:
+            raise ValueError('active sprint not found at: {}'.format(self.conf['sprint']['active_sprint_path']))
+
+        # update the trello board
+        active_sprint['trello_board'] = await self.trello.get_board(active_sprint['trello_board']['id'])
+        return active_sprint
+
+    async def get_closing_sprint(self):
+        closing_sprint = await self.load_sprint(self.conf['sprint']['closing_sprint_path'])
+        if closing_sprint is None:
+            raise ValueError('closing sprint not found at: {}'.format(self.conf['sprint']['closing_sprint_path']))
+
+        # update the trello board
+        closing_sprint['trello_board'] = await self.trello.get_board(closing_sprint['trello_board']['id'])
+        return closing_sprint
+
+    async def migrate_cards(self, moves, max_workers=None, progress=None):
+        """ Apply card moves concurrently, see :meth:`AgileBot.migrate_cards`.
+        """
+        moves = list(moves)
+        semaphore = asyncio.Semaphore(max(int(max_workers or self.trello.conf.max_workers or 1), 1))
+        progress = progress or self.log_migration_progress
+        done = [0]
+
+        async def move(card_id, update_c):
+            async with semaphore:
+                try:
+                    result = self.migration_result(card_id, card=await self.trello.update_card(card_id, update_c))
+                except Exception as e:
+                    result = self.migration_result(card_id, error=e)
+            done[0] += 1
+            progress(done[0], len(moves), result)
+            return result
+
+        return await asyncio.gather(*[move(*m) for m in moves])
+
+    async def rollover_cards(self, closing_sprint, new_sprint, card_filter=None):
+        """ Forward the open cards from the closing sprint to the new sprint, see :meth:`AgileBot.rollover_cards`.
+        """
+        if card_filter is not None or self.agile.rollover_strategy != 'lists':
+            return await self.migrate_cards(self.card_moves(closing_sprint, new_sprint, card_filter=card_filter))
+
+        list_moves = list(self.list_moves(closing_sprint, new_sprint))
+        moved_lists = await asyncio.gather(
+            *[self.trello.move_all_cards(l_id, new_sprint['trello_board']['id'], t_id) for l_id, t_id in list_moves],
+            return_exceptions=True
+        )
+        results = []
+        fallback_list_ids = []
+        for (list_id, _), cards in zip(list_moves, moved_lists):
+            if isinstance(cards, Exception):
+                logger.warning('unable to move all cards from list {}, moving them one at a time: {}({})'.format(
+                    list_id, type(cards).__name__, cards))
+                fallback_list_ids.append(list_id)
+                continue
+            logger.info('moved {} cards from list {}'.format(len(cards), list_id))
+            results.extend(self.migration_result(c['id'], card=c) for c in cards)
+
+        if fallback_list_ids:
+            results.extend(await self.migrate_cards(self.card_moves(
+                closing_sprint, new_sprint, list_ids=fallback_list_ids)))
+        return results
+
+    async def start_new_sprint(self,
+                               sprint_name=None,
+                               sprint_list_names=None,
+                               organization_id=None,
+                               close_active_sprint=True,
+                               closing_sprint_name=None,
+                               card_filter=None):
+        #
+        # create a new sprint
+        new_sprint = self.new_sprint(sprint_name, sprint_list_names)
+
+        # load the currently active sprint (to become the closing sprint)
+        if close_active_sprint is True:
+            closing_sprint = await self.load_sprint(self.conf['sprint']['active_sprint_path'])
+            if closing_sprint is not None:
+                closing_sprint['trello_board'] = await self.trello.get_board(
+                    closing_sprint['trello_board']['id'], fields=self.rollover_fields(card_filter))
+        elif closing_sprint_name is not None:
+            resp = await self.trello.find_boards(board_name=closing_sprint_name, organization_id=organization_id)
+            closing_sprint = self.closing_sprint_from_boards(closing_sprint_name, resp)
+        else:
+            closing_sprint = None
+
+        # create a trello board for the sprint
+        new_sprint['trello_board'] = await self.trello.create_board(
+            board_name=new_sprint['name'],
+            list_names=new_sprint['lists'],
+            organization_id=organization_id,
+            members=self.sprint_members(closing_sprint)
+        )
+        logger.debug('created new sprint board: {}'.format(new_sprint['trello_board']['name']))
+
+        # update the name of the closing sprint
+        if closing_sprint is not None:
+            csn = self.closing_sprint_name(closing_sprint['name'])
+            closing_sprint_board = await self.trello.update_board(
+                board_id=closing_sprint['trello_board']['id'],
+                data={'name': csn}
+            )
+            logger.debug('updated closing sprint name to: {}'.format(closing_sprint_board['name']))
+
+            # save the old (closing) sprint
+            closing_sprint = self.sprint_from_board(closing_sprint_board, sprint_name=csn)
+            await self.save_sprint(self.conf['sprint']['closing_sprint_path'], closing_sprint)
+
+        # save the new (active) sprint
+        await self.save_sprint(self.conf['sprint']['active_sprint_path'], new_sprint)
+
+        # if not migrating from a sprint that is closing, we are all done
+        if closing_sprint is None:
+            return new_sprint
+
+        # migrate cards
+        migrated_cards = await self.rollover_cards(closing_sprint, new_sprint, card_filter=card_filter)
+        failed_cards = [r for r in migrated_cards if not r['success']]
+        logger.debug('migrated cards: {}'.format(len(migrated_cards) - len(failed_cards)))
+        if failed_cards:
+            logger.warning('failed to migrate {} of {} cards'.format(len(failed_cards), len(migrated_cards)))
+
+        # get the updated trello board and save the new sprint (since we may have added cards)
+        new_sprint['trello_board'] = await self.trello.get_board(new_sprint['trello_board']['id'])
+        await self.save_sprint(self.conf['sprint']['active_sprint_path'], new_sprint)
+
+        # log it
+        logger.info('successfully started new sprint: {}'.format(new_sprint['trello_board']['name']))
+
+        # report the per-card migration results
+        new_sprint['migrated_cards'] = list(migrated_cards)
+
+        # all done!
+        return new_sprint
@@ -2,56 +2,71 @@ __author__ = 'ntrepid8'
 import argparse
 import os
 import sys
-import pytoml as toml
 import logging
 from copy import copy
-from pprint import pformat
-from colorlog import ColoredFormatter
 from agilebot import (
-    agilebot,
+    cmd_batch,
+    cmd_daemon,
     cmd_slack,
     cmd_sprint,
     cmd_trello,
+    defaults,
     util
 )
 
 CONFIG_PATH = os.path.expanduser('~/.agilebot.toml')
-root_logger = logging.getLogger()
-handler = logging.StreamHandler()
-formatter = ColoredFormatter(
-    "%(log_color)s[%(levelname)s (%(asctime)s) %(name)s]%(reset)s %(message)s",
-    datefmt=None,
-    reset=True,
-    log_colors={
-        'DEBUG': 'cyan',
-        'INFO': 'green',
-        'WARNING': 'yellow',
-        'ERROR': 'red',
-        'CRITICAL': 'red,bg_white',
-    },
-    secondary_log_colors={},
-    style='%'
-)
-handler.setFormatter(formatter)
-root_logger.addHandler(handler)
 logger = logging.getLogger('agilebot')
 
 
+def setup_logging():
+    handler = logging.StreamHandler()
+    if handler.stream.isatty():
+        # only pay for colorlog when someone is watching, cron and prompt integrations get plain log lines
+        from colorlog import ColoredFormatter
+        formatter = ColoredFormatter(
+            "%(log_color)s[%(levelname)s (%(asctime)s) %(name)s]%(reset)s %(message)s",
+            datefmt=None,
+            reset=True,
+            log_colors={
+                'DEBUG': 'cyan',
+                'INFO': 'green',
+                'WARNING': 'yellow',
+                'ERROR': 'red',
+                'CRITICAL': 'red,bg_white',
+            },
+            secondary_log_colors={},
+            style='%'
+        )
+    else:
+        formatter = logging.Formatter("[%(levelname)s (%(asctime)s) %(name)s] %(message)s")
+    handler.setFormatter(formatter)
+    logging.getLogger().addHandler(handler)
+
+
 def get_first_value(*args):
     return next((i for i in args if i is not None), None)
 
 
-def main():
+def load_conf():
     # config
-    default_conf = agilebot.AgileBot.default_conf()
+    default_conf = defaults.agilebot_conf()
     conf = copy(default_conf)
 
     # config file
     if os.path.isfile(CONFIG_PATH):
+        import pytoml as toml
         with open(CONFIG_PATH, 'r') as f:
             toml_config = toml.load(f)
             conf = util.left_merge(default_conf, toml_config)
+    return conf
+
 
+def run(argv, conf):
+    """ Parse and run a command line, used by `main` and by the daemon for forwarded commands.
+
+    :param argv: command line arguments, without the program name
+    :param conf: configuration as returned by `load_conf`
+    """
     # logging conf
     log_level = os.environ.get('AGILEBOT_LOG_LEVEL') or conf['logging']['level']
     logger.setLevel(log_level)
@@ -71,6 +86,8 @@ def main():
 
     # boards sub-command
     sub_commands = {
+        'batch': cmd_batch.sub_command(subparsers),
+        'daemon': cmd_daemon.sub_command(subparsers),
         'slack': cmd_slack.sub_command(subparsers),
         'sprint': cmd_sprint.sub_command(subparsers),
         'trello': cmd_trello.sub_command(subparsers)
@@ -89,7 +106,7 @@ def main():
     )
 
     # parse the arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     sc_0 = getattr(args, 'subparser_0', '')
     sc_1 = getattr(args, 'subparser_1', '')
     logger.debug('subparser_0: {}'.format(sc_0))
@@ -98,17 +115,18 @@ def main():
     # agile
     conf['agile']['sprint_lists'] = args.agile_sprint_lists
 
-    if not len(sys.argv) > 1:
+    if not argv:
         # no arguments given, show help
-        logger.debug('sys.argv: {}'.format(len(sys.argv)))
+        logger.debug('argv: {}'.format(len(argv)))
         parser.print_help()
     elif args.conf:
         # show current config
         logger.debug('printing current configuration')
+        import pytoml as toml
         print(toml.dumps(conf, sort_keys=True))
     elif not getattr(args, 'func', None):
         # if the sub-command function is not set, show help
-        logger.debug('sub-command function not found for: {}'.format(str(sys.argv)))
+        logger.debug('sub-command function not found for: {}'.format(str(argv)))
         if hasattr(args, 'func_help'):
             logger.debug('show sub-command specific help')
             func_help = args.func_help
@@ -116,8 +134,8 @@ def main():
             logger.debug('show general help')
             func_help = parser.print_help
         func_help()
-        logger.debug('args namespace: {}'.format(pformat(args)))
-        logger.debug('main parser: {}'.format(pformat(parser)))
+        logger.debug('args namespace: {!r}'.format(args))
+        logger.debug('main parser: {!r}'.format(parser))
         sys.exit(1)
     else:
         # run the sub-command
@@ -125,5 +143,18 @@ def main():
         args.func(args, conf)
 
 
+def main():
+    setup_logging()
+    argv = sys.argv[1:]
+
+    # hand the command to a running daemon, it already has warm connections and caches
+    if cmd_daemon.should_forward(argv):
+        exit_code = cmd_daemon.forward(argv)
+        if exit_code is not None:
+            sys.exit(exit_code)
+
+    run(argv, load_conf())
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,165 @@
+__author__ = 'ntrepid8'
+import agilebot.cmd_util
+import logging
+from logging import NullHandler
+import io
+import json
+import sys
+import argparse
+import shlex
+import threading
+from agilebot import util
+from agilebot.cmd_daemon import is_local_command
+logger = logging.getLogger('agilebot.batch')
+logger.addHandler(NullHandler())
+
+
+class ThreadOutput(io.TextIOBase):
+    """ Text stream writing to a buffer set for the current thread, output of other threads is discarded.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        buf = getattr(self.local, 'buffer', None)
+        if buf is not None:
+            buf.write(s)
+        return len(s)
+
+
+def parse_line(line_no, line):
+    """ Parse a batch line, either a command line or a JSON request.
+
+    JSON requests are objects with `argv` (list) or `command` (string) and an optional `id` echoed in the result,
+    or simply an `argv` list. A leading `agilebot` is ignored, blank lines and `#` comments are skipped.
+
+    :return: request `{'line', 'id', 'argv'}` or None if the line is empty
+    :rtype: dict
+    """
+    text = line.strip()
+    if not text or text.startswith('#'):
+        return None
+    request = {'line': line_no, 'id': None}
+    if text[0] in '{[':
+        data = json.loads(text)
+        if isinstance(data, list):
+            data = {'argv': data}
+        request['id'] = data.get('id')
+        argv = data.get('argv')
+        if argv is None:
+            argv = shlex.split(data.get('command') or '')
+    else:
+        argv = shlex.split(text)
+    argv = [str(a) for a in argv]
+    if argv and argv[0] == 'agilebot':
+        argv = argv[1:]
+    request['argv'] = argv
+    return request
+
+
+def iter_requests(lines):
+    for line_no, line in enumerate(lines, start=1):
+        try:
+            request = parse_line(line_no, line)
+        except ValueError as e:
+            request = {'line': line_no, 'id': None, 'argv': None, 'error': 'invalid request: {}'.format(e)}
+        if request is not None:
+            yield request
+
+
+def run_request(request, stdout, stderr):
+    result = {
+        'line': request['line'],
+        'id': request['id'],
+        'argv': request['argv'],
+        'exit_code': 1,
+        'stdout': '',
+        'stderr': request.get('error', '')
+    }
+    if request['argv'] is None:
+        return result
+    if not request['argv'] or is_local_command(request['argv']):
+        result['stderr'] = 'invalid command: {}'.format(' '.join(request['argv']))
+        return result
+
+    stdout.local.buffer = io.StringIO()
+    stderr.local.buffer = io.StringIO()
+    try:
+        result['exit_code'] = agilebot.cmd_util.run_argv(request['argv'], logger)
+        result['stdout'] = stdout.local.buffer.getvalue()
+        result['stderr'] = stderr.local.buffer.getvalue()
+    finally:
+        stdout.local.buffer = None
+        stderr.local.buffer = None
+    return result
+
+
+def run_batch(lines, out, concurrency=1):
+    """ Run the commands in `lines`, writing one JSON result per command to `out` in the order they were read.
+
+    :return: number of failed commands
+    :rtype: int
+    """
+    stdout = ThreadOutput()
+    stderr = ThreadOutput()
+    handler = logging.StreamHandler(stderr)
+    handler.setFormatter(logging.Formatter('[%(levelname)s (%(asctime)s) %(name)s] %(message)s'))
+    root_logger = logging.getLogger()
+
+    # every command reuses the same bots, so connections and caches are set up once for the whole batch
+    agilebot.cmd_util.keep_bots_warm()
+    failed = 0
+    old_stdout, old_stderr = sys.stdout, sys.stderr
+    root_logger.addHandler(handler)
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        results = util.iter_bounded(
+            lambda r: run_request(r, stdout, stderr), iter_requests(lines), max_workers=concurrency)
+        for result, error in results:
+            if error is not None:
+                raise error
+            if result['exit_code']:
+                failed += 1
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+    finally:
+        sys.stdout, sys.stderr = old_stdout, old_stderr
+        root_logger.removeHandler(handler)
+    return failed
+
+
+def cmd_batch(args, conf):
+    logger.debug('CMD batch')
+    try:
+        if args.file in (None, '-'):
+            failed = run_batch(sys.stdin, sys.stdout, concurrency=args.concurrency)
+        else:
+            with open(args.file) as f:
+                failed = run_batch(f, sys.stdout, concurrency=args.concurrency)
+    except Exception as e:
+        util.log_generic_error(e, sys.exc_info(), logger)
+        sys.exit(1)
+    if failed:
+        logger.warning('{} command(s) failed'.format(failed))
+        sys.exit(1)
+
+
+def sub_command(main_subparsers):
+    # batch sub-command
+    b_desc = 'Run many commands with a single AgileBot, reading one command line or JSON request per line.'
+    b_parser = main_subparsers.add_parser(
+        'batch',
+        description=b_desc,
+        formatter_class=argparse.MetavarTypeHelpFormatter,
+        help=b_desc)
+    b_parser.add_argument(
+        'file', nargs='?', type=str, help='file with one command per line, defaults to stdin')
+    b_parser.add_argument(
+        '--concurrency', '-c', type=int, default=1, help='number of commands to run at the same time')
+    b_parser.set_defaults(func=cmd_batch, func_help=b_parser.print_help)
+
+    return b_parser
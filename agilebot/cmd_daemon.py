@@ -0,0 +1,145 @@
+__author__ = 'ntrepid8'
+import logging
+from logging import NullHandler
+import json
+import sys
+import argparse
+import os
+import socket
+from agilebot import util
+from functools import partial
+logger = logging.getLogger('agilebot.daemon')
+logger.addHandler(NullHandler())
+
+# sub-commands that always run in the calling process: batch reads our stdin, the others run until stopped
+LOCAL_COMMANDS = ('batch', 'daemon', 'sprint webhook', 'sprint wh')
+
+
+def is_local_command(argv):
+    return argv[0] in LOCAL_COMMANDS or ' '.join(argv[:2]) in LOCAL_COMMANDS
+
+
+def get_socket_path():
+    return os.environ.get('AB_SOCKET_PATH', os.path.join(util.get_base_path(), 'agilebot.sock'))
+
+
+def should_forward(argv, socket_path=None):
+    if os.environ.get('AGILEBOT_NO_DAEMON'):
+        return False
+    if argv and is_local_command(argv):
+        return False
+    return os.path.exists(socket_path or get_socket_path())
+
+
+def send_request(request, socket_path=None):
+    """ Send a request to the daemon and yield its response messages.
+
+    :raises OSError: if no daemon is listening on the socket
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path or get_socket_path())
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        with sock.makefile('r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+    finally:
+        sock.close()
+
+
+def forward(argv, socket_path=None):
+    """ Run a command line in the daemon, writing its output to our stdout and stderr.
+
+    :return: exit code of the command, or None if no daemon is listening
+    :rtype: int
+    """
+    request = {'argv': argv, 'env': dict(os.environ), 'cwd': os.getcwd()}
+    messages = send_request(request, socket_path)
+    try:
+        msg = next(messages)
+    except (OSError, StopIteration) as e:
+        logger.debug('daemon not available, running locally: {}'.format(e))
+        return None
+
+    # the daemon may already have changed something, so from here on never fall back to running locally
+    try:
+        while True:
+            if 'exit_code' in msg:
+                return msg['exit_code']
+            for name, stream in (('stdout', sys.stdout), ('stderr', sys.stderr)):
+                if name in msg:
+                    stream.write(msg[name])
+                    stream.flush()
+            msg = next(messages)
+    except (OSError, ValueError, StopIteration) as e:
+        logger.error('lost connection to the daemon: {}'.format(e))
+        return 1
+
+
+def cmd_daemon_start(args, conf):
+    logger.debug('CMD daemon start')
+    from agilebot.daemon import Daemon
+    socket_path = args.socket or get_socket_path()
+    try:
+        Daemon(socket_path).serve_forever()
+    except Exception as e:
+        util.log_generic_error(e, sys.exc_info(), logger)
+        sys.exit(1)
+
+
+def cmd_daemon_request(args, conf, request):
+    socket_path = args.socket or get_socket_path()
+    try:
+        for msg in send_request(request, socket_path):
+            if 'stdout' in msg:
+                sys.stdout.write(msg['stdout'])
+    except OSError as e:
+        logger.error('daemon not running on {}: {}'.format(socket_path, e))
+        sys.exit(1)
+
+
+def cmd_daemon_help(parser, text=None):
+    t = text or 'daemon'
+    logger.debug('show {} help'.format(t))
+    parser.print_help()
+
+
+def sub_command(main_subparsers):
+    # daemon sub-command
+    daemon_parser = main_subparsers.add_parser(
+        'daemon', help='keep warm bots behind a local socket, other commands are forwarded to it while it runs')
+    subparsers = daemon_parser.add_subparsers(help='sub-commands', dest='subparser_1')
+    daemon_parser.set_defaults(func_help=partial(cmd_daemon_help, daemon_parser, 'daemon'))
+
+    # SUB-COMMAND: start (s)
+    s_desc = 'Run the daemon in the foreground.'
+    s_parser = subparsers.add_parser(
+        'start',
+        aliases=['s'],
+        description=s_desc,
+        formatter_class=argparse.MetavarTypeHelpFormatter,
+        help=s_desc)
+    s_parser.set_defaults(func=cmd_daemon_start)
+
+    # SUB-COMMAND: stop
+    stop_desc = 'Stop a running daemon.'
+    stop_parser = subparsers.add_parser(
+        'stop',
+        description=stop_desc,
+        formatter_class=argparse.MetavarTypeHelpFormatter,
+        help=stop_desc)
+    stop_parser.set_defaults(func=partial(cmd_daemon_request, request={'stop': True}))
+
+    # SUB-COMMAND: status
+    status_desc = 'Show the status of a running daemon.'
+    status_parser = subparsers.add_parser(
+        'status',
+        description=status_desc,
+        formatter_class=argparse.MetavarTypeHelpFormatter,
+        help=status_desc)
+    status_parser.set_defaults(func=partial(cmd_daemon_request, request={'status': True}))
+
+    for p in (s_parser, stop_parser, status_parser):
+        p.add_argument('--socket', type=str, help='path of the daemon socket')
+
+    return daemon_parser
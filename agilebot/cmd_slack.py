@@ -22,13 +22,44 @@ def create_bot(args, conf):
 def cmd_slack_post(args, conf):
     bot = create_bot(args, conf)
     try:
-        resp = bot.slack.post_msg(
-            text=args.text,
-            webhook_url=args.webhook_url,
-            channel=args.channel,
-            icon_emoji=args.icon_emoji,
-            username=args.username
-        )
+        if args.queue:
+            # delivered in the background, the outbox gets flush_timeout seconds to deliver it at exit
+            msg_id = bot.slack.queue_msg(
+                text=args.text,
+                webhook_url=args.webhook_url,
+                channel=args.channel,
+                icon_emoji=args.icon_emoji,
+                username=args.username
+            )
+            resp = {'queued': msg_id}
+        elif args.thread_ts or (bot.slack.conf.token and not bot.slack.conf.webhook_url):
+            # replies and token only setups go through the Web API
+            resp = bot.slack.post_message(
+                text=args.text,
+                channel=args.channel,
+                thread_ts=args.thread_ts,
+                icon_emoji=args.icon_emoji,
+                username=args.username
+            )
+        else:
+            resp = bot.slack.post_msg(
+                text=args.text,
+                webhook_url=args.webhook_url,
+                channel=args.channel,
+                icon_emoji=args.icon_emoji,
+                username=args.username
+            )
+    except Exception as e:
+        logger.error('{}'.format(e))
+        sys.exit(1)
+    else:
+        print(json.dumps(resp))
+
+
+def cmd_slack_update(args, conf):
+    bot = create_bot(args, conf)
+    try:
+        resp = bot.slack.update_message(channel=args.channel, ts=args.ts, text=args.text)
     except Exception as e:
         logger.error('{}'.format(e))
         sys.exit(1)
@@ -71,10 +102,12 @@ def sub_command(main_subparsers):
     p_add_group.add_argument('--channel', type=str, help='Slack channel name')
     p_add_group.add_argument('--username', type=str, help='username of the bot')
     p_add_group.add_argument('--webhook-url', type=str, help='Slack url to POST the message to')
+    p_add_group.add_argument('--token', type=str, help='Slack API token, used when there is no webhook url')
     p_add_group.set_defaults(
         channel=os.environ.get('SLACK_CHANNEL'),
         username=os.environ.get('SLACK_USERNAME'),
         webhook_url=os.environ.get('SLACK_WEBHOOK_URL'),
+        token=os.environ.get('SLACK_TOKEN'),
     )
 
     # p optional arguments
@@ -83,6 +116,10 @@ def sub_command(main_subparsers):
         'Optional and may be specified here or in the configuration file.'
     )
     p_opt_group.add_argument('--icon-emoji', default=':ghost:', type=str, help='emoji to use for the bot icon')
+    p_opt_group.add_argument(
+        '--queue', action='store_true', help='queue the message in the outbox instead of waiting for slack')
+    p_opt_group.add_argument(
+        '--thread-ts', type=str, help='reply in the thread of this message (Web API only)')
     p_opt_group.set_defaults(
         icon_emoji=os.environ.get('SLACK_ICON_EMOJI'),
     )
@@ -90,4 +127,24 @@ def sub_command(main_subparsers):
     # p defaults
     p_parser.set_defaults(func=cmd_slack_post)
 
+    # SUB-COMMAND: update (u)
+    u_desc = 'Update the text of a message posted with the Web API.'
+    u_parser = subparsers.add_parser(
+        'update',
+        aliases=['u'],
+        description=u_desc,
+        formatter_class=argparse.MetavarTypeHelpFormatter,
+        help=u_desc)
+    u_req_group = u_parser.add_argument_group(
+        'required arguments',
+    )
+    u_req_group.add_argument('--text', '-t', required=True, type=str, help='new text content of the message')
+    u_req_group.add_argument('--ts', required=True, type=str, help='timestamp (ts) of the message')
+    u_req_group.add_argument('--channel', required=True, type=str, help='Slack channel id of the message')
+    u_parser.add_argument('--token', type=str, help='Slack API token')
+    u_parser.set_defaults(
+        token=os.environ.get('SLACK_TOKEN'),
+    )
+    u_parser.set_defaults(func=cmd_slack_update)
+
     return slack_parser
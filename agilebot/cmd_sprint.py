@@ -5,13 +5,15 @@ from logging import NullHandler
 import sys
 import json
 import argparse
+import os
+import signal
 from agilebot import util
 logger = logging.getLogger('agilebot.sprint')
 logger.addHandler(NullHandler())
 ACTIVE_PATTERN = '*(active)'
 
 
-def find_sprints(args, conf):
+def find_sprints(args, conf, stream=False):
     search_args = ['open']
     board_name = None
     if args.name and args.active and ACTIVE_PATTERN in args.name:
@@ -26,10 +28,16 @@ def find_sprints(args, conf):
     try:
         conf = util.update_config_group('sprint', args, conf)
         bot = agilebot.cmd_util.create_bot(conf, logger)
-        resp = bot.trello.find_boards(
-            board_name=board_name,
-            organization_id=args.organization_id
-        )
+        if stream:
+            resp = bot.trello.iter_boards(
+                board_name=board_name,
+                organization_id=args.organization_id
+            )
+        else:
+            resp = bot.trello.find_boards(
+                board_name=board_name,
+                organization_id=args.organization_id
+            )
 
     except Exception as e:
         util.log_generic_error(e, sys.exc_info(), logger)
@@ -40,6 +48,15 @@ def find_sprints(args, conf):
 
 def cmd_sprint_info(args, bot):
     logger.debug('CMD sprint.info')
+    if args.ndjson:
+        # write each sprint board as soon as it is fetched
+        try:
+            for board in find_sprints(args, bot, stream=True):
+                print(json.dumps(board), flush=True)
+        except Exception as e:
+            util.log_generic_error(e, sys.exc_info(), logger)
+            sys.exit(1)
+        return
     resp = find_sprints(args, bot)
     print(json.dumps(resp))
 
@@ -64,8 +81,7 @@ def cmd_render_name(args, conf):
     logger.debug('CMD sprint render-name')
     try:
         conf = util.update_config_group('sprint', args, conf)
-        bot = agilebot.cmd_util.create_bot(conf, logger)
-        rendered_name = bot.format_sprint_name(args.sprint_name)
+        rendered_name = util.format_sprint_name(args.sprint_name)
     except Exception as e:
         util.log_generic_error(e, sys.exc_info(), logger)
         sys.exit(1)
@@ -99,6 +115,86 @@ def cmd_sprint_get_closing(args, conf):
         print(json.dumps(resp))
 
 
+def cmd_sprint_get_sprints(args, conf):
+    logger.debug('CMD sprint get-sprints')
+    try:
+        conf = util.update_config_group('sprint', args, conf)
+        bot = agilebot.cmd_util.create_bot(conf, logger)
+        resp = bot.get_sprints()
+    except Exception as e:
+        util.log_generic_error(e, sys.exc_info(), logger)
+        sys.exit(1)
+    else:
+        print(json.dumps(resp))
+
+
+def cmd_sprint_sync(args, conf):
+    logger.debug('CMD sprint sync')
+    try:
+        conf = util.update_config_group('sprint', args, conf)
+        bot = agilebot.cmd_util.create_bot(conf, logger)
+        if args.closing:
+            resp = bot.sync_sprint(bot.conf['sprint']['closing_sprint_path'])
+        else:
+            resp = bot.sync_sprint()
+    except Exception as e:
+        util.log_generic_error(e, sys.exc_info(), logger)
+        sys.exit(1)
+    else:
+        print(json.dumps(resp))
+
+
+def cmd_sprint_cards(args, conf):
+    logger.debug('CMD sprint cards')
+    try:
+        conf = util.update_config_group('sprint', args, conf)
+        bot = agilebot.cmd_util.create_bot(conf, logger)
+        member = args.member
+        if member == 'me':
+            member = bot.current_member_id()
+        resp = bot.store.find_cards(
+            member=member,
+            label=args.label,
+            board_name=args.board_name,
+            list_name=args.list_name,
+            due_before=args.due_before,
+            due_after=args.due_after,
+            include_closed=args.include_closed
+        )
+    except Exception as e:
+        util.log_generic_error(e, sys.exc_info(), logger)
+        sys.exit(1)
+    else:
+        print(json.dumps(resp))
+
+
+def cmd_sprint_webhook(args, conf):
+    logger.debug('CMD sprint webhook')
+    from agilebot.webhook import WebhookReceiver
+    try:
+        conf = util.update_config_group('webhook', args, conf)
+        bot = agilebot.cmd_util.create_bot(conf, logger)
+        receiver = WebhookReceiver(bot, **conf['webhook'])
+    except Exception as e:
+        util.log_generic_error(e, sys.exc_info(), logger)
+        sys.exit(1)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    exit_code = 0
+    try:
+        receiver.start()
+        # the server runs in its own thread, wait for ctrl-c or SIGTERM
+        signal.pause()
+    except (KeyboardInterrupt, SystemExit):
+        logger.info('stopping the webhook receiver')
+    except Exception as e:
+        util.log_generic_error(e, sys.exc_info(), logger)
+        exit_code = 1
+    finally:
+        receiver.stop()
+    sys.exit(exit_code)
+
+
 def sub_command(main_subparsers):
 
     # sprint command
@@ -111,6 +207,8 @@ def sub_command(main_subparsers):
     parser_info.add_argument('--active', action='store_true', help='info about the active sprint')
     parser_info.add_argument('--organization-id', default=None, help='organization id')
     parser_info.add_argument('--name', default='Sprint*', help='sprint board name (supports *patterns*)')
+    parser_info.add_argument(
+        '--ndjson', action='store_true', help='write one board per line as soon as it is fetched')
     parser_info.set_defaults(func=cmd_sprint_info, func_help=parser_info.print_help)
 
     #
@@ -158,6 +256,13 @@ def sub_command(main_subparsers):
         description=ga_desc,
         formatter_class=argparse.MetavarTypeHelpFormatter,
         help=ga_desc)
+    # ga optional arguments
+    ga_parser.add_argument(
+        '--no-freshness-check',
+        dest='freshness_check',
+        action='store_false',
+        default=None,
+        help='always get the full trello board instead of reusing the stored board when it is unchanged')
     # ga defaults
     ga_parser.set_defaults(func=cmd_sprint_get_active, func_help=ga_parser.print_help)
     
@@ -170,5 +275,88 @@ def sub_command(main_subparsers):
         description=gc_desc,
         formatter_class=argparse.MetavarTypeHelpFormatter,
         help=gc_desc)
+    # gc optional arguments
+    gc_parser.add_argument(
+        '--no-freshness-check',
+        dest='freshness_check',
+        action='store_false',
+        default=None,
+        help='always get the full trello board instead of reusing the stored board when it is unchanged')
     # gc defaults
     gc_parser.set_defaults(func=cmd_sprint_get_closing, func_help=gc_parser.print_help)
+
+    #
+    # SUB-COMMAND: get-sprints (gs)
+    gs_desc = 'get the active and closing sprints together, with batched requests'
+    gs_parser = sprint_subparsers.add_parser(
+        'get-sprints',
+        aliases=['gs'],
+        description=gs_desc,
+        formatter_class=argparse.MetavarTypeHelpFormatter,
+        help=gs_desc)
+    # gs optional arguments
+    gs_parser.add_argument(
+        '--no-freshness-check',
+        dest='freshness_check',
+        action='store_false',
+        default=None,
+        help='always get the full trello boards instead of reusing the stored boards when they are unchanged')
+    # gs defaults
+    gs_parser.set_defaults(func=cmd_sprint_get_sprints, func_help=gs_parser.print_help)
+
+    #
+    # SUB-COMMAND: sync (sy)
+    sy_desc = 'update the stored sprint board with the changes made since the last sync'
+    sy_parser = sprint_subparsers.add_parser(
+        'sync',
+        aliases=['sy'],
+        description=sy_desc,
+        formatter_class=argparse.MetavarTypeHelpFormatter,
+        help=sy_desc)
+    # sy optional arguments
+    sy_parser.add_argument('--closing', action='store_true', help='sync the closing sprint instead of the active one')
+    # sy defaults
+    sy_parser.set_defaults(func=cmd_sprint_sync, func_help=sy_parser.print_help)
+
+    #
+    # SUB-COMMAND: cards (c)
+    c_desc = 'query the cards of the sprints in the local store, without calling the trello API'
+    c_parser = sprint_subparsers.add_parser(
+        'cards',
+        aliases=['c'],
+        description=c_desc,
+        formatter_class=argparse.MetavarTypeHelpFormatter,
+        help=c_desc)
+    # c optional arguments
+    c_parser.add_argument('--member', type=str, help='member id or username ("me" for the current trello user)')
+    c_parser.add_argument('--label', type=str, help='label id or name')
+    c_parser.add_argument('--board-name', type=str, help='board name (supports SQL LIKE % patterns)')
+    c_parser.add_argument('--list-name', type=str, help='list name')
+    c_parser.add_argument('--due-before', type=str, help='only cards due before this ISO 8601 date')
+    c_parser.add_argument('--due-after', type=str, help='only cards due after this ISO 8601 date')
+    c_parser.add_argument(
+        '--include-closed', action='store_true', help='include archived cards and cards on closed boards')
+    # c defaults
+    c_parser.set_defaults(func=cmd_sprint_cards, func_help=c_parser.print_help)
+
+    #
+    # SUB-COMMAND: webhook (wh)
+    wh_desc = 'keep the active and closing sprint boards up to date from trello webhooks'
+    wh_parser = sprint_subparsers.add_parser(
+        'webhook',
+        aliases=['wh'],
+        description=wh_desc,
+        formatter_class=argparse.MetavarTypeHelpFormatter,
+        help=wh_desc)
+    # wh optional arguments
+    wh_parser.add_argument('--host', type=str, help='address to listen on')
+    wh_parser.add_argument('--port', type=int, help='port to listen on')
+    wh_parser.add_argument('--callback-url', type=str, help='public url trello POSTs the webhook requests to')
+    wh_parser.add_argument(
+        '--no-verify', dest='verify', action='store_const', const=False,
+        help='accept webhook requests without a valid X-Trello-Webhook signature')
+    wh_parser.set_defaults(
+        callback_url=os.environ.get('AB_WEBHOOK_CALLBACK_URL'),
+    )
+    # wh defaults
+    wh_parser.set_defaults(func=cmd_sprint_webhook, func_help=wh_parser.print_help)
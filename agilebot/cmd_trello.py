@@ -30,10 +30,32 @@ def cmd_trello_get_board(args, conf):
         print(json.dumps(board))
 
 
+def cmd_trello_list_cards(args, conf):
+    logger.debug('CMD trello list-cards')
+    bot = create_bot(args, conf)
+    try:
+        # write the cards as they arrive, the board may be too big to hold in memory
+        sys.stdout.write('[')
+        for i, card in enumerate(bot.trello.iter_cards(
+                board_id=args.board_id, card_filter=args.filter, page_size=args.page_size)):
+            sys.stdout.write('{}{}'.format(', ' if i else '', json.dumps(card)))
+        sys.stdout.write(']\n')
+    except Exception as e:
+        util.log_generic_error(e, sys.exc_info(), logger)
+        sys.exit(1)
+
+
 def cmd_trello_find_boards(args, conf):
     logger.debug('CMD trello find-boards')
     bot = create_bot(args, conf)
     try:
+        if args.ndjson:
+            # write each board as soon as it is fetched
+            for board in bot.trello.iter_boards(
+                    board_name=args.board_name,
+                    organization_id=args.organization_id):
+                print(json.dumps(board), flush=True)
+            return
         boards = bot.trello.find_boards(
             board_name=args.board_name,
             organization_id=args.organization_id
@@ -82,8 +104,11 @@ def sub_command(main_subparsers):
     # common arguments parser
     trello_common_parser = argparse.ArgumentParser(description='trello common arguments', add_help=False)
     trello_common_parser.add_argument('--organization-id', type=str, help='organization ID in Trello')
+    trello_common_parser.add_argument(
+        '--max-workers', type=int, help='maximum number of concurrent requests to Trello')
     trello_common_parser.set_defaults(
         organization_id=os.environ.get('TRELLO_ORGANIZATION_ID'),
+        max_workers=os.environ.get('TRELLO_MAX_WORKERS'),
     )
 
     # trello auth argument group
@@ -116,6 +141,25 @@ def sub_command(main_subparsers):
     # set defaults
     gb_parser.set_defaults(func=cmd_trello_get_board, func_help=gb_parser.print_help)
     
+    # SUB-COMMAND: list-cards (lc)
+    lc_desc = 'list the cards of a trello board, one page at a time'
+    lc_parser = trello_subparsers.add_parser(
+        'list-cards',
+        aliases=['lc'],
+        description=lc_desc,
+        parents=[trello_common_parser],
+        formatter_class=argparse.MetavarTypeHelpFormatter,
+        help=lc_desc)
+    # lc required arguments
+    lc_req_group = lc_parser.add_argument_group('required arguments')
+    lc_req_group.add_argument('--board-id', required=True, type=str, help='board Id')
+    # lc optional arguments
+    lc_parser.add_argument(
+        '--filter', default='open', type=str, help='card filter: open, closed, visible or all (default: open)')
+    lc_parser.add_argument('--page-size', default=500, type=int, help='number of cards per request (max 1000)')
+    # lc set defaults
+    lc_parser.set_defaults(func=cmd_trello_list_cards, func_help=lc_parser.print_help)
+
     # SUB-COMMAND: find_boards (fb)
     fb_desc = 'find trello boards by name or pattern, if not pattern is give all boards are returned'
     fb_parser = trello_subparsers.add_parser(
@@ -128,6 +172,8 @@ def sub_command(main_subparsers):
     # fb optional arguments
     fb_parser.add_argument(
         '--board-name', type=str, help='board name (supports Unix style pattern matching)')
+    fb_parser.add_argument(
+        '--ndjson', action='store_true', help='write one board per line as soon as it is fetched')
     # fb set defaults
     fb_parser.set_defaults(func=cmd_trello_find_boards, func_help=fb_parser.print_help)
 
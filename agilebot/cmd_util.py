@@ -1,10 +1,63 @@
+import json
 import sys
-from agilebot import agilebot
+import threading
+from agilebot import util
 
 __author__ = 'ntrepid8'
 
+# bots kept warm between commands by the daemon and the batch runner, keyed by their configuration
+_warm_bots = None
+MAX_WARM_BOTS = 8
+_warm_bots_lock = threading.Lock()
+
+
+def keep_bots_warm():
+    global _warm_bots
+    if _warm_bots is None:
+        _warm_bots = {}
+
+
+def run_argv(argv, logger):
+    """ Run a command line in this process, as `agilebot` would.
+
+    :param argv: command line arguments, without the program name
+    :return: exit code of the command
+    :rtype: int
+    """
+    from agilebot import cmd
+    try:
+        cmd.run(argv, cmd.load_conf())
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except Exception as e:
+        util.log_generic_error(e, sys.exc_info(), logger)
+        return 1
+    return 0
+
 
 def create_bot(conf, logger):
+    # the bots pull in the whole network stack, only load them for the sub-commands that need them
+    from agilebot import agilebot
+
+    if _warm_bots is None:
+        return new_bot(agilebot, conf, logger)
+
+    bot_key = json.dumps(conf, sort_keys=True, default=str)
+    with _warm_bots_lock:
+        if bot_key in _warm_bots:
+            logger.debug('reusing warm AgileBot')
+            return _warm_bots[bot_key]
+        bot = new_bot(agilebot, conf, logger)
+        if len(_warm_bots) >= MAX_WARM_BOTS:
+            _warm_bots.pop(next(iter(_warm_bots)))
+        _warm_bots[bot_key] = bot
+    return bot
+
+
+def new_bot(agilebot, conf, logger):
     try:
         bot = agilebot.AgileBot(**conf)
     except Exception as e:
@@ -13,4 +66,4 @@ def create_bot(conf, logger):
     else:
         logger.debug('AgileBot created successfully')
 
-    return bot
\ No newline at end of file
+    return bot
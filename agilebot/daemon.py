@@ -0,0 +1,149 @@
+__author__ = 'ntrepid8'
+import agilebot.cmd_util
+from contextlib import redirect_stderr, redirect_stdout
+import io
+import json
+import logging
+from logging import NullHandler
+import os
+import signal
+import socket
+import sys
+import time
+logger = logging.getLogger('agilebot.lib.daemon')
+logger.addHandler(NullHandler())
+
+
+class MessageStream(io.TextIOBase):
+    """ Text stream sending everything written to it to the client as `{name: text}` JSON lines.
+    """
+
+    def __init__(self, conn, name):
+        self.conn = conn
+        self.name = name
+        self.lost = False
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        if s and not self.lost:
+            try:
+                self.conn.sendall((json.dumps({self.name: s}) + '\n').encode('utf-8'))
+            except OSError:
+                # stop the command, but don't fail again while it logs the error
+                self.lost = True
+                raise
+        return len(s)
+
+
+class Daemon(object):
+    """ Run command lines forwarded by `agilebot` on a Unix domain socket.
+
+    Commands run one at a time in this process, so the bots created by `cmd_util.create_bot` are kept warm
+    between commands along with their connection pools and caches. Each command sees the environment and working
+    directory of the client that sent it, and its output is streamed back as it is written.
+    """
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.started = None
+        self.commands = 0
+        self.stopping = False
+
+    def bind(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if os.path.exists(self.socket_path):
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                # left over from a daemon that didn't shut down cleanly
+                os.remove(self.socket_path)
+            else:
+                sock.close()
+                raise ValueError('daemon already running on {}'.format(self.socket_path))
+            sock.close()
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        dir_name = os.path.dirname(self.socket_path)
+        if dir_name and not os.path.exists(dir_name):
+            os.makedirs(dir_name)
+        # the daemon acts with our credentials, only we may talk to it
+        old_umask = os.umask(0o177)
+        try:
+            sock.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        sock.listen(16)
+        return sock
+
+    def serve_forever(self):
+        agilebot.cmd_util.keep_bots_warm()
+        sock = self.bind()
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        self.started = time.time()
+        logger.info('daemon listening on {}'.format(self.socket_path))
+        try:
+            while not self.stopping:
+                conn, _ = sock.accept()
+                with conn:
+                    try:
+                        self.handle(conn)
+                    except Exception as e:
+                        logger.warning('error handling request: {}({})'.format(type(e).__name__, e))
+        finally:
+            sock.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            logger.info('daemon stopped')
+
+    def handle(self, conn):
+        with conn.makefile('rb') as f:
+            request = json.loads(f.readline().decode('utf-8'))
+
+        exit_code = 0
+        if request.get('stop'):
+            self.stopping = True
+        elif request.get('status'):
+            status = {
+                'pid': os.getpid(),
+                'socket': self.socket_path,
+                'started': self.started,
+                'commands': self.commands,
+                'warm_bots': len(agilebot.cmd_util._warm_bots or {})
+            }
+            conn.sendall((json.dumps({'stdout': json.dumps(status) + '\n'}) + '\n').encode('utf-8'))
+        else:
+            exit_code = self.run_command(
+                conn, request.get('argv') or [], request.get('env') or {}, request.get('cwd'))
+        conn.sendall((json.dumps({'exit_code': exit_code}) + '\n').encode('utf-8'))
+
+    def run_command(self, conn, argv, env, cwd=None):
+        """ Run a forwarded command line, as if it had been run by the client.
+
+        :return: exit code of the command
+        :rtype: int
+        """
+        self.commands += 1
+        logger.debug('running: agilebot {}'.format(' '.join(argv)))
+        stdout = MessageStream(conn, 'stdout')
+        stderr = MessageStream(conn, 'stderr')
+        handler = logging.StreamHandler(stderr)
+        handler.setFormatter(logging.Formatter('[%(levelname)s (%(asctime)s) %(name)s] %(message)s'))
+        root_logger = logging.getLogger()
+
+        old_env = dict(os.environ)
+        old_cwd = os.getcwd()
+        os.environ.clear()
+        os.environ.update(env)
+        root_logger.addHandler(handler)
+        try:
+            if cwd:
+                os.chdir(cwd)
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                return agilebot.cmd_util.run_argv(argv, logger)
+        finally:
+            root_logger.removeHandler(handler)
+            os.environ.clear()
+            os.environ.update(old_env)
+            os.chdir(old_cwd)
@@ -0,0 +1,92 @@
+__author__ = 'ntrepid8'
+import os
+from agilebot import util
+from agilebot.util import DEFAULT_SPRINT_NAME_TPL
+
+# default configuration, kept free of the network stack so the command line can build it before knowing which
+# sub-command (if any) needs the bots
+
+
+def trello_conf():
+    return {
+        'api_key': None,
+        'api_secret': None,
+        'oauth_token': None,
+        'oauth_secret': None,
+        'organization_id': None,
+        'max_workers': 8,
+        'rate_limit_key': 300,
+        'rate_limit_token': 100,
+        'rate_limit_interval': 10,
+        'max_retries': 5,
+        'adaptive_concurrency': True,
+        'latency_spike_factor': 3.0,
+        'cache_enabled': True,
+        'cache_path': os.path.join(util.get_base_path(), 'cache', 'trello'),
+        'cache_ttl': 0,
+        'cache_max_bytes': 50 * 1024 * 1024,
+        'board_index_ttl': 30,
+        'template_board_id': None,
+        'template_keep_from_source': 'none'
+    }
+
+
+def slack_conf():
+    return {
+        'webhook_url': None,
+        'channel': None,
+        'icon_emoji': ':ghost:',
+        'username': 'agilebot',
+        'token': None,
+        'outbox_path': os.path.join(util.get_base_path(), 'slack_outbox'),
+        'coalesce_window': 0,
+        'max_retries': 5,
+        'flush_timeout': 10,
+        'rate_limit_channel': 1,
+        'rate_limit_interval': 1
+    }
+
+
+def agilebot_conf():
+    # Agilebot environment variables
+    ab_base_path = util.get_base_path()
+    ab_active_sprint_path = os.environ.get(
+        'AB_ACTIVE_SPRINT_PATH',
+        '{base_path}/sprint_active.json'.format(
+            base_path=ab_base_path)
+    )
+    ab_closing_sprint_path = os.environ.get(
+        'AB_CLOSING_SPRINT_PATH',
+        '{base_path}/sprint_closing.json'.format(
+            base_path=ab_base_path)
+    )
+
+    return {
+        'agile': {
+            'backlogs': [],
+            'sprint_lists': ['To Do', 'In Progress', 'Completed', 'Deployed'],
+            'sprint_lists_forward': ['To Do', 'In Progress'],
+            'rollover_strategy': 'lists'
+        },
+        'logging': {
+            'level': 'INFO'
+        },
+        'sprint': {
+            'name_tpl': DEFAULT_SPRINT_NAME_TPL,
+            'active_sprint_path': ab_active_sprint_path,
+            'closing_sprint_path': ab_closing_sprint_path,
+            'freshness_check': True,
+            'rollover_call_budget': None
+        },
+        'store': {
+            'path': os.path.join(ab_base_path, 'agilebot.db')
+        },
+        'webhook': {
+            'host': '127.0.0.1',
+            'port': 8321,
+            'callback_url': None,
+            'verify': True
+        },
+        'slack': slack_conf(),
+        'trello': trello_conf(),
+    }
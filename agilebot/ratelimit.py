@@ -0,0 +1,83 @@
+__author__ = 'ntrepid8'
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import threading
+import time
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def parse_retry_after(value):
+    """ Parse a Retry-After header, either delay-seconds or an HTTP date.
+
+    :return: number of seconds to wait, or None if the header is missing or invalid
+    :rtype: float
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class TokenBucket(object):
+    """ Thread safe token bucket allowing `capacity` requests per `interval` seconds.
+
+    Tokens are reserved rather than waited for: `reserve` always takes a token and returns how long the caller
+    must wait before using it, so callers can sleep however suits them (`time.sleep`, `asyncio.sleep`, ...).
+    """
+
+    def __init__(self, capacity, interval):
+        self.capacity = float(capacity)
+        self.interval = float(interval)
+        self.rate = self.capacity / self.interval
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, tokens=1):
+        """ Take `tokens` from the bucket.
+
+        :return: number of seconds to wait before the reserved tokens may be used
+        :rtype: float
+        """
+        with self.lock:
+            self.refill()
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def drain(self, seconds):
+        """ Empty the bucket so no tokens are available for `seconds`, e.g. after the server throttled us.
+        """
+        with self.lock:
+            self.refill()
+            # the next token becomes available in `seconds`
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+def get_bucket(name, capacity, interval):
+    """ Get the process wide bucket for `name`, creating it if needed.
+
+    Sharing buckets by name lets every client using the same credentials draw from the same limit.
+    """
+    key = (name, capacity, interval)
+    with _buckets_lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(capacity, interval)
+        return _buckets[key]
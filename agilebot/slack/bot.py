@@ -1,25 +1,27 @@
 __author__ = 'ntrepid8'
 import requests
-from agilebot import util
+from agilebot import defaults, ratelimit, util
 import json
+import logging
+from logging import NullHandler
+import time
+logger = logging.getLogger('agilebot.lib.slack')
+logger.addHandler(NullHandler())
+SLACK_API_BASE_URL = 'https://slack.com/api'
 
 
 class SlackBot(object):
 
     def __init__(self, conf=None):
         self.conf = util.gen_namedtuple('Slack', self.default_conf(), conf or {})
+        self.session = requests.Session()
+        self._outbox = None
 
     @classmethod
     def default_conf(cls):
-        return {
-            'webhook_url': None,
-            'channel': None,
-            'icon_emoji': ':ghost:',
-            'username': 'agilebot',
-            'token': None
-        }
+        return defaults.slack_conf()
 
-    def post_msg(self, text, webhook_url=None, channel=None, icon_emoji=None, username=None):
+    def build_msg(self, text, channel=None, icon_emoji=None, username=None):
         data = {
             'text': text,
             'channel': channel or self.conf.channel,
@@ -33,13 +35,134 @@ class SlackBot(object):
                     key=k,
                     value=v
                 ))
+        return data
+
+    def send_webhook(self, data, webhook_url=None):
+        """ POST a message built by `build_msg` to an incoming webhook.
+
+        :rtype: requests.Response
+        """
         webhook_url = webhook_url or self.conf.webhook_url
         if not webhook_url:
             raise ValueError('webhook_url is required')
-        resp = requests.post(
+        resp = self.session.post(
             webhook_url,
             headers={'Content-Type': 'application/json'},
             data=json.dumps(data))
+        util.log_request_response(resp, logger)
+        return resp
+
+    def channel_bucket(self, channel):
+        # slack allows about one message per second per channel, shared by every bot using the same token
+        return ratelimit.get_bucket(
+            ('slack.channel', self.conf.token, channel),
+            int(self.conf.rate_limit_channel),
+            float(self.conf.rate_limit_interval)
+        )
+
+    def send_api(self, method, data):
+        """ POST a Web API method once, waiting for the channel's rate limit first.
+
+        :rtype: requests.Response
+        """
+        if not self.conf.token:
+            raise ValueError('token is required')
+        bucket = self.channel_bucket(data.get('channel')) if data.get('channel') else None
+        if bucket is not None:
+            time.sleep(bucket.reserve())
+        resp = self.session.post(
+            '{base_url}/{method}'.format(base_url=SLACK_API_BASE_URL, method=method),
+            headers={
+                'Content-Type': 'application/json; charset=utf-8',
+                'Authorization': 'Bearer {}'.format(self.conf.token)
+            },
+            data=json.dumps(data))
+        util.log_request_response(resp, logger)
+        if resp.status_code == requests.codes.too_many_requests and bucket is not None:
+            bucket.drain(ratelimit.parse_retry_after(resp.headers.get('Retry-After')) or 1.0)
+        return resp
+
+    def api_call(self, method, data):
+        """ Call a Web API method, retrying after `Retry-After` when slack throttles us.
+
+        :return: decoded response
+        :rtype: dict
+        """
+        attempt = 0
+        while True:
+            resp = self.send_api(method, data)
+            if resp.status_code != requests.codes.too_many_requests or attempt >= int(self.conf.max_retries):
+                break
+            delay = ratelimit.parse_retry_after(resp.headers.get('Retry-After')) or 1.0
+            logger.warning('throttled by Slack, retrying {} in {:.2f}s'.format(method, delay))
+            if not data.get('channel'):
+                # with a channel, send_api drained its bucket and waits for it instead
+                time.sleep(delay)
+            attempt += 1
+        if resp.status_code != requests.codes.ok:
+            raise ValueError('http error: {}'.format(resp.status_code))
+        body = resp.json()
+        if not body.get('ok'):
+            raise ValueError('slack error: {}'.format(body.get('error')))
+        return body
+
+    def post_message(self, text, channel=None, thread_ts=None, blocks=None, icon_emoji=None, username=None):
+        """ Post a message with the Web API (chat.postMessage), optionally as a reply in a thread.
+
+        :return: decoded response, `ts` and `channel` identify the message for replies and updates
+        :rtype: dict
+        """
+        data = self.build_msg(text, channel=channel, icon_emoji=icon_emoji, username=username)
+        if thread_ts:
+            data['thread_ts'] = thread_ts
+        if blocks:
+            data['blocks'] = blocks
+        return self.api_call('chat.postMessage', data)
+
+    def update_message(self, channel, ts, text, blocks=None):
+        """ Replace the content of a message posted with `post_message` (chat.update).
+
+        :rtype: dict
+        """
+        data = {'channel': channel, 'ts': ts, 'text': text, 'link_names': 1}
+        if blocks:
+            data['blocks'] = blocks
+        return self.api_call('chat.update', data)
+
+    def post_msg(self, text, webhook_url=None, channel=None, icon_emoji=None, username=None):
+        data = self.build_msg(text, channel=channel, icon_emoji=icon_emoji, username=username)
+        resp = self.send_webhook(data, webhook_url)
         if resp.status_code != requests.codes.ok:
             raise ValueError('http error: {}'.format(resp.status_code))
         return {'success': True}
+
+    @property
+    def outbox(self):
+        """ Outbox delivering queued messages in the background, started on first use.
+
+        :rtype: agilebot.slack.outbox.SlackOutbox
+        """
+        if self._outbox is None:
+            from agilebot.slack.outbox import SlackOutbox
+            self._outbox = SlackOutbox(
+                self,
+                self.conf.outbox_path,
+                coalesce_window=float(self.conf.coalesce_window),
+                max_retries=int(self.conf.max_retries),
+                flush_timeout=float(self.conf.flush_timeout)
+            )
+            self._outbox.start()
+        return self._outbox
+
+    def queue_msg(self, text, webhook_url=None, channel=None, icon_emoji=None, username=None):
+        """ Queue a message for delivery by the outbox and return without waiting for Slack. Without a webhook
+        url the message is posted with the Web API.
+
+        :return: id of the queued message
+        :rtype: str
+        """
+        data = self.build_msg(text, channel=channel, icon_emoji=icon_emoji, username=username)
+        webhook_url = webhook_url or self.conf.webhook_url
+        if not webhook_url and not self.conf.token:
+            raise ValueError('webhook_url or token is required')
+        return self.outbox.enqueue(data, webhook_url)
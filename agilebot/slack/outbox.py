@@ -0,0 +1,260 @@
+__author__ = 'ntrepid8'
+import requests
+from agilebot import ratelimit
+import atexit
+import fcntl
+import json
+import logging
+from logging import NullHandler
+import os
+import random
+import threading
+import time
+import uuid
+logger = logging.getLogger('agilebot.lib.slack')
+logger.addHandler(NullHandler())
+
+# responses worth retrying, anything else means the message will never be accepted
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class SlackOutbox(object):
+    """ Persistent queue of Slack messages delivered by a background thread.
+
+    Queued messages are written to a spool directory first, so they survive a crash or a Slack outage and are
+    delivered by the next outbox started on the same spool. Failed deliveries are retried with jittered
+    exponential backoff (or after `Retry-After` when throttled), messages that can't be delivered are moved to
+    the `failed` directory of the spool.
+
+    With a `coalesce_window`, messages for the same webhook and channel are held for up to that many seconds and
+    sent as a single message.
+    """
+
+    def __init__(self, bot, path, coalesce_window=0, max_retries=5, backoff_base=1.0, backoff_max=300.0,
+                 flush_timeout=10):
+        self.bot = bot
+        self.path = os.path.expanduser(path)
+        self.failed_path = os.path.join(self.path, 'failed')
+        self.coalesce_window = float(coalesce_window)
+        self.max_retries = int(max_retries)
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self.flush_timeout = flush_timeout
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopping = False
+        self.idle = False
+        self.queued = 0
+        for p in (self.path, self.failed_path):
+            if not os.path.exists(p):
+                os.makedirs(p)
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.run, name='slack-outbox', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, data, webhook_url=None):
+        """ Add a message to the spool.
+
+        :param data: message as built by `SlackBot.build_msg`
+        :param webhook_url: incoming webhook to post to, the message is posted with the Web API without one
+        :return: id of the message
+        :rtype: str
+        """
+        now = time.time()
+        msg_id = '{:020d}-{}'.format(int(now * 1e6), uuid.uuid4().hex[:8])
+        self.write(msg_id, {
+            'id': msg_id,
+            'webhook_url': webhook_url,
+            'data': data,
+            'enqueued': now,
+            'not_before': now,
+            'attempts': 0
+        })
+        logger.debug('queued slack message {}'.format(msg_id))
+        with self.condition:
+            self.queued += 1
+            self.idle = False
+            self.condition.notify_all()
+        return msg_id
+
+    def msg_path(self, msg_id, path=None):
+        return os.path.join(path or self.path, '{}.json'.format(msg_id))
+
+    def write(self, msg_id, msg, path=None):
+        dest = self.msg_path(msg_id, path)
+        tmp_path = '{}.tmp'.format(dest)
+        with open(tmp_path, 'w') as f:
+            json.dump(msg, f)
+        os.replace(tmp_path, dest)
+
+    def pending(self):
+        """ Messages in the spool, oldest first.
+
+        :rtype: list
+        """
+        messages = []
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.path, name)) as f:
+                    messages.append(json.load(f))
+            except (IOError, OSError, ValueError):
+                # delivered by someone else in the meantime, or still being written
+                continue
+        return messages
+
+    def group_key(self, msg):
+        if self.coalesce_window <= 0:
+            return msg['id']
+        data = msg['data']
+        return msg['webhook_url'], data.get('channel'), data.get('username'), data.get('icon_emoji')
+
+    def deliver_due(self):
+        """ Deliver the messages that are due.
+
+        :return: time the next message is due, or None if the spool is empty
+        :rtype: float
+        """
+        groups = {}
+        for msg in self.pending():
+            groups.setdefault(self.group_key(msg), []).append(msg)
+
+        now = time.time()
+        next_due = None
+        for messages in groups.values():
+            due = min(max(m['not_before'], m['enqueued'] + self.coalesce_window) for m in messages)
+            ready = [m for m in messages if m['not_before'] <= now]
+            if due > now or not ready:
+                due = max(due, min(m['not_before'] for m in messages))
+                next_due = due if next_due is None else min(next_due, due)
+                continue
+            retry_at = self.deliver(ready)
+            if retry_at is not None:
+                next_due = retry_at if next_due is None else min(next_due, retry_at)
+            if len(ready) < len(messages):
+                later = min(m['not_before'] for m in messages if m['not_before'] > now)
+                next_due = later if next_due is None else min(next_due, later)
+        return next_due
+
+    def deliver(self, messages):
+        """ Send `messages` to Slack as a single message.
+
+        :return: time of the next attempt if the delivery failed and will be retried
+        :rtype: float
+        """
+        data = dict(messages[0]['data'])
+        data['text'] = '\n'.join(m['data']['text'] for m in messages)
+        retry_after = None
+        webhook_url = messages[0]['webhook_url']
+        try:
+            if webhook_url:
+                resp = self.bot.send_webhook(data, webhook_url)
+            else:
+                resp = self.bot.send_api('chat.postMessage', data)
+        except requests.RequestException as e:
+            error = '{}({})'.format(type(e).__name__, e)
+        else:
+            if resp.status_code == requests.codes.ok and not webhook_url and not resp.json().get('ok'):
+                self.fail(messages, 'slack error: {}'.format(resp.json().get('error')))
+                return None
+            if resp.status_code == requests.codes.ok:
+                for m in messages:
+                    self.remove(m)
+                logger.debug('delivered {} slack message(s) to {}'.format(len(messages), data.get('channel')))
+                return None
+            error = 'http error: {}'.format(resp.status_code)
+            retry_after = ratelimit.parse_retry_after(resp.headers.get('Retry-After'))
+            if resp.status_code not in RETRY_STATUS_CODES:
+                self.fail(messages, error)
+                return None
+
+        attempts = max(m['attempts'] for m in messages) + 1
+        if attempts > self.max_retries:
+            self.fail(messages, error)
+            return None
+        delay = retry_after
+        if delay is None:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempts))
+        logger.warning('slack delivery failed ({}), retrying in {:.2f}s'.format(error, delay))
+        retry_at = time.time() + delay
+        for m in messages:
+            m['attempts'] = attempts
+            m['not_before'] = retry_at
+            m['error'] = error
+            self.write(m['id'], m)
+        return retry_at
+
+    def remove(self, msg):
+        try:
+            os.remove(self.msg_path(msg['id']))
+        except OSError:
+            pass
+
+    def fail(self, messages, error):
+        for m in messages:
+            m['error'] = error
+            self.write(m['id'], m, path=self.failed_path)
+            self.remove(m)
+        logger.error('unable to deliver {} slack message(s): {}'.format(len(messages), error))
+
+    def run(self):
+        lock_path = os.path.join(self.path, '.lock')
+        while True:
+            with self.condition:
+                if self.stopping:
+                    return
+                queued = self.queued
+            # only one outbox delivers from a spool at a time
+            with open(lock_path, 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    next_due = self.deliver_due()
+                except Exception as e:
+                    logger.error('slack outbox error: {}({})'.format(type(e).__name__, e))
+                    next_due = time.time() + self.backoff_base
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+            with self.condition:
+                if self.queued != queued:
+                    # messages were queued while we were delivering
+                    continue
+                if next_due is None:
+                    self.idle = True
+                    self.condition.notify_all()
+                timeout = None if next_due is None else next_due - time.time()
+                if not self.stopping and (timeout is None or timeout > 0):
+                    self.condition.wait(timeout)
+
+    def flush(self, timeout=None):
+        """ Wait until every queued message has been delivered or given up on.
+
+        :return: True if the spool is empty
+        :rtype: bool
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while not self.idle:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """ Give pending messages up to `timeout` (by default `flush_timeout`) seconds to be delivered, then stop.
+        Undelivered messages stay in the spool for the next outbox.
+        """
+        if self.thread is None:
+            return
+        if not self.flush(self.flush_timeout if timeout is None else timeout):
+            logger.warning('slack messages left in the outbox: {}'.format(self.path))
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        self.thread.join(1.0)
+        self.thread = None
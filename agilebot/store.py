@@ -0,0 +1,248 @@
+__author__ = 'ntrepid8'
+from contextlib import contextmanager
+import json
+import logging
+from logging import NullHandler
+import os
+import sqlite3
+logger = logging.getLogger('agilebot.lib.store')
+logger.addHandler(NullHandler())
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS boards (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    id_organization TEXT,
+    closed INTEGER NOT NULL DEFAULT 0,
+    date_last_activity TEXT,
+    url TEXT
+);
+CREATE TABLE IF NOT EXISTS lists (
+    id TEXT PRIMARY KEY,
+    board_id TEXT NOT NULL,
+    name TEXT,
+    closed INTEGER NOT NULL DEFAULT 0,
+    pos REAL
+);
+CREATE TABLE IF NOT EXISTS cards (
+    id TEXT PRIMARY KEY,
+    board_id TEXT NOT NULL,
+    list_id TEXT,
+    name TEXT,
+    closed INTEGER NOT NULL DEFAULT 0,
+    due TEXT,
+    date_last_activity TEXT,
+    url TEXT,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS members (
+    id TEXT PRIMARY KEY,
+    username TEXT,
+    full_name TEXT
+);
+CREATE TABLE IF NOT EXISTS token_members (
+    token_hash TEXT PRIMARY KEY,
+    member_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS labels (
+    id TEXT PRIMARY KEY,
+    board_id TEXT,
+    name TEXT,
+    color TEXT
+);
+CREATE TABLE IF NOT EXISTS board_members (
+    board_id TEXT NOT NULL,
+    member_id TEXT NOT NULL,
+    PRIMARY KEY (board_id, member_id)
+);
+CREATE TABLE IF NOT EXISTS card_members (
+    card_id TEXT NOT NULL,
+    member_id TEXT NOT NULL,
+    PRIMARY KEY (card_id, member_id)
+);
+CREATE TABLE IF NOT EXISTS card_labels (
+    card_id TEXT NOT NULL,
+    label_id TEXT NOT NULL,
+    PRIMARY KEY (card_id, label_id)
+);
+CREATE INDEX IF NOT EXISTS lists_board_id ON lists (board_id);
+CREATE INDEX IF NOT EXISTS cards_board_id ON cards (board_id);
+CREATE INDEX IF NOT EXISTS cards_list_id ON cards (list_id);
+CREATE INDEX IF NOT EXISTS cards_due ON cards (due);
+CREATE INDEX IF NOT EXISTS members_username ON members (username);
+CREATE INDEX IF NOT EXISTS labels_board_id ON labels (board_id);
+CREATE INDEX IF NOT EXISTS labels_name ON labels (name);
+CREATE INDEX IF NOT EXISTS board_members_member_id ON board_members (member_id);
+CREATE INDEX IF NOT EXISTS card_members_member_id ON card_members (member_id);
+CREATE INDEX IF NOT EXISTS card_labels_label_id ON card_labels (label_id);
+'''
+
+
+class BoardStore(object):
+    """ Local SQLite store of trello boards, lists, cards, members and labels.
+
+    Boards are saved as snapshots: saving a board replaces everything previously stored for it, so the store
+    always reflects the latest board seen by agilebot and can be queried without any API call.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self._initialized = False
+
+    @contextmanager
+    def connect(self):
+        if not self._initialized:
+            dir_name = os.path.dirname(self.path)
+            if dir_name and not os.path.exists(dir_name):
+                os.makedirs(dir_name)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            if not self._initialized:
+                conn.executescript(SCHEMA)
+                self._initialized = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save_board(self, board):
+        """ Save a board as returned by `TrelloBot.get_board`, replacing any previously stored snapshot of it.
+        """
+        b_id = board['id']
+        with self.connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO boards (id, name, id_organization, closed, date_last_activity, url) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (b_id, board.get('name'), board.get('idOrganization'), int(bool(board.get('closed'))),
+                 board.get('dateLastActivity'), board.get('url')))
+
+            # replace the lists, cards and memberships of the board
+            conn.execute('DELETE FROM card_members WHERE card_id IN (SELECT id FROM cards WHERE board_id = ?)', (b_id,))
+            conn.execute('DELETE FROM card_labels WHERE card_id IN (SELECT id FROM cards WHERE board_id = ?)', (b_id,))
+            conn.execute('DELETE FROM cards WHERE board_id = ?', (b_id,))
+            conn.execute('DELETE FROM lists WHERE board_id = ?', (b_id,))
+            conn.execute('DELETE FROM board_members WHERE board_id = ?', (b_id,))
+
+            conn.executemany(
+                'INSERT OR REPLACE INTO lists (id, board_id, name, closed, pos) VALUES (?, ?, ?, ?, ?)',
+                [(l['id'], b_id, l.get('name'), int(bool(l.get('closed'))), l.get('pos'))
+                 for l in board.get('lists') or []])
+
+            members = board.get('members') or []
+            conn.executemany(
+                'INSERT OR REPLACE INTO members (id, username, full_name) VALUES (?, ?, ?)',
+                [(m['id'], m.get('username'), m.get('fullName')) for m in members])
+            conn.executemany(
+                'INSERT OR REPLACE INTO board_members (board_id, member_id) VALUES (?, ?)',
+                [(b_id, m['id']) for m in members])
+
+            self.insert_cards(conn, board.get('cards') or [], board_id=b_id, labels=board.get('labels') or [])
+        logger.debug('stored board {}: {} cards'.format(b_id, len(board.get('cards') or [])))
+
+    def save_cards(self, cards):
+        """ Add or replace some cards, e.g. cards moved to another board, leaving the other cards of their boards
+        alone. Each card is stored on the board of its `idBoard`.
+        """
+        with self.connect() as conn:
+            card_ids = [(c['id'],) for c in cards]
+            conn.executemany('DELETE FROM card_members WHERE card_id = ?', card_ids)
+            conn.executemany('DELETE FROM card_labels WHERE card_id = ?', card_ids)
+            self.insert_cards(conn, cards)
+        logger.debug('stored {} cards'.format(len(cards)))
+
+    def get_token_member(self, token_hash):
+        """ Id of the member an oauth token belongs to, `None` if it was never saved.
+        """
+        with self.connect() as conn:
+            row = conn.execute('SELECT member_id FROM token_members WHERE token_hash = ?', (token_hash,)).fetchone()
+        return row['member_id'] if row else None
+
+    def save_token_member(self, token_hash, member):
+        """ Remember the member an oauth token belongs to, as returned by `TrelloBot.get_current_member`.
+        """
+        with self.connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO members (id, username, full_name) VALUES (?, ?, ?)',
+                (member['id'], member.get('username'), member.get('fullName')))
+            conn.execute(
+                'INSERT OR REPLACE INTO token_members (token_hash, member_id) VALUES (?, ?)',
+                (token_hash, member['id']))
+
+    def insert_cards(self, conn, cards, board_id=None, labels=()):
+        labels = list(labels)
+        for c in cards:
+            labels.extend(c.get('labels') or [])
+        conn.executemany(
+            'INSERT OR REPLACE INTO labels (id, board_id, name, color) VALUES (?, ?, ?, ?)',
+            [(l['id'], l.get('idBoard') or board_id, l.get('name'), l.get('color')) for l in labels])
+
+        conn.executemany(
+            'INSERT OR REPLACE INTO cards (id, board_id, list_id, name, closed, due, date_last_activity, url, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [(c['id'], board_id or c['idBoard'], c.get('idList'), c.get('name'), int(bool(c.get('closed'))), c.get('due'),
+              c.get('dateLastActivity'), c.get('url'), json.dumps(c)) for c in cards])
+        conn.executemany(
+            'INSERT OR REPLACE INTO card_members (card_id, member_id) VALUES (?, ?)',
+            [(c['id'], m_id) for c in cards for m_id in c.get('idMembers') or []])
+        conn.executemany(
+            'INSERT OR REPLACE INTO card_labels (card_id, label_id) VALUES (?, ?)',
+            [(c['id'], l_id) for c in cards for l_id in c.get('idLabels') or []])
+
+    def find_cards(self, member=None, label=None, board_id=None, board_name=None, list_name=None,
+                   due_before=None, due_after=None, include_closed=False):
+        """ Query the stored cards.
+
+        :param member: member id or username
+        :param label: label id or name
+        :param board_name: board name, supports SQL LIKE patterns
+        :param due_before: only cards due before this ISO 8601 date
+        :param due_after: only cards due after this ISO 8601 date
+        :param include_closed: include archived cards and cards on closed boards
+        :return: cards (as stored) with `board_name` and `list_name` added
+        :rtype: list
+        """
+        joins = []
+        where = []
+        args = []
+        if member is not None:
+            joins.append('JOIN card_members cm ON cm.card_id = c.id')
+            where.append('(cm.member_id = ? OR cm.member_id IN (SELECT id FROM members WHERE username = ?))')
+            args.extend([member, member])
+        if label is not None:
+            joins.append('JOIN card_labels cl ON cl.card_id = c.id')
+            where.append('(cl.label_id = ? OR cl.label_id IN (SELECT id FROM labels WHERE name = ?))')
+            args.extend([label, label])
+        if board_id is not None:
+            where.append('c.board_id = ?')
+            args.append(board_id)
+        if board_name is not None:
+            where.append('b.name LIKE ?')
+            args.append(board_name)
+        if list_name is not None:
+            where.append('l.name = ?')
+            args.append(list_name)
+        if due_before is not None:
+            where.append('c.due IS NOT NULL AND c.due < ?')
+            args.append(due_before)
+        if due_after is not None:
+            where.append('c.due IS NOT NULL AND c.due > ?')
+            args.append(due_after)
+        if not include_closed:
+            where.append('c.closed = 0 AND b.closed = 0')
+
+        query = (
+            'SELECT DISTINCT c.data AS data, b.name AS board_name, l.name AS list_name FROM cards c '
+            'JOIN boards b ON b.id = c.board_id LEFT JOIN lists l ON l.id = c.list_id {joins} {where} '
+            'ORDER BY c.due IS NULL, c.due, b.name, l.pos'
+        ).format(joins=' '.join(joins), where='WHERE ' + ' AND '.join(where) if where else '')
+        with self.connect() as conn:
+            rows = conn.execute(query, args).fetchall()
+        cards = []
+        for row in rows:
+            card = json.loads(row['data'])
+            card['board_name'] = row['board_name']
+            card['list_name'] = row['list_name']
+            cards.append(card)
+        return cards
+
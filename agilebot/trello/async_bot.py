@@ -0,0 +1,283 @@
+__author__ = 'ntrepid8'
+from oauthlib.oauth1 import Client as OAuth1Client
+from agilebot import util
+from agilebot.trello.bot import (
+    TrelloBot,
+    TEMPLATE_UNAVAILABLE_STATUS_CODES,
+    TRELLO_API_BASE_URL,
+    TRELLO_BOARD_INDEX_FIELDS
+)
+import asyncio
+from functools import partial
+import logging
+from logging import NullHandler
+from fnmatch import fnmatch
+from urllib.parse import urlencode
+import json
+try:
+    import aiohttp
+    import yarl
+except ImportError:
+    aiohttp = None
+logger = logging.getLogger('agilebot.lib.trello')
+logger.addHandler(NullHandler())
+
+
+class AsyncTrelloBot(object):
+    """ asyncio version of :class:`TrelloBot`, backed by an aiohttp session.
+
+    Uses the same configuration as :class:`TrelloBot` and should be closed when no longer needed, either with
+    `await bot.close()` or by using it as an async context manager.
+    """
+
+    def __init__(self, conf=None, session=None):
+        if aiohttp is None:
+            raise ImportError('aiohttp is required for AsyncTrelloBot (pip install agilebot[async])')
+        self.conf = util.gen_namedtuple('Trello', self.default_conf(), conf or {})
+        self.oauth = OAuth1Client(
+            client_key=self.conf.api_key,
+            client_secret=self.conf.api_secret,
+            resource_owner_key=self.conf.oauth_token,
+            resource_owner_secret=self.conf.oauth_secret)
+        # the adaptive concurrency limit blocks threads, the event loop is bounded by max_workers instead
+        self.scheduler = TrelloBot.create_scheduler(self.conf._replace(adaptive_concurrency=False))
+        self._session = session
+        self._hydrate_semaphore = None
+
+    @classmethod
+    def default_conf(cls):
+        return TrelloBot.default_conf()
+
+    @classmethod
+    def required_conf(cls):
+        return TrelloBot.required_conf()
+
+    def check_required_conf(self, **kwargs):
+        TrelloBot.check_required_conf(self, **kwargs)
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(headers={'Accept': 'application/json'})
+        return self._session
+
+    def scheduler_stats(self):
+        return self.scheduler.stats()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def request(self, method, path, params=None, data=None):
+        # ensure we have all the configuration required to make a request
+        self.check_required_conf()
+
+        url = '{base_url}{path}'.format(base_url=TRELLO_API_BASE_URL, path=path)
+        if params:
+            url = '{url}?{query}'.format(url=url, query=urlencode(params))
+        headers = {}
+        body = None
+        if data is not None:
+            headers['Content-Type'] = 'application/json'
+            body = json.dumps(data)
+
+        # send it within the rate limits, retrying like TrelloBot does
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.scheduler.reserve())
+
+            # sign every attempt with the same OAuth1 credentials as TrelloBot, a retry needs a fresh nonce
+            signed_url, signed_headers, signed_body = self.oauth.sign(
+                url, http_method=method, body=body, headers=headers)
+            try:
+                async with self.session.request(
+                        method, yarl.URL(signed_url, encoded=True), headers=signed_headers, data=signed_body) as resp:
+                    logger.debug('{method} {code} {url}'.format(method=method, code=resp.status, url=url))
+                    delay = self.scheduler.retry_delay(
+                        method, attempt, status_code=resp.status, retry_after=resp.headers.get('Retry-After'))
+                    if delay is None:
+                        if resp.status != 200:
+                            raise ValueError('http error: {}'.format(resp.status))
+                        return await resp.json(content_type=None)
+            except aiohttp.ClientConnectionError as e:
+                delay = self.scheduler.retry_delay(method, attempt, error=e)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def get_board(self, board_id, lists=None, cards=None, fields=None):
+        return await self.request(
+            'GET',
+            '/boards/{board_id}'.format(board_id=board_id),
+            params=TrelloBot.board_params(self, lists=lists, cards=cards, fields=fields)
+        )
+
+    async def find_boards(self, board_name=None, lists=None, cards=None, organization_id=None):
+        # param setup
+        p_name = board_name or '*'
+        p_filters = ['open']
+        p_lists = lists or 'open'
+        p_cards = cards or 'open'
+        p_organization_id = organization_id or self.conf.organization_id
+
+        boards = await self.request(
+            'GET',
+            '/members/me/boards',
+            params={
+                'filter': ', '.join(p_filters),
+                'fields': TRELLO_BOARD_INDEX_FIELDS
+            }
+        )
+
+        # filter by organization_id and name
+        boards = [b for b in boards if b['idOrganization'] == p_organization_id]
+        boards = [b for b in boards if fnmatch(b['name'], p_name)]
+
+        # deal with cards, hydrating up to max_workers boards at a time
+        if self._hydrate_semaphore is None:
+            self._hydrate_semaphore = asyncio.Semaphore(int(self.conf.max_workers or 1))
+
+        async def hydrate(b):
+            async with self._hydrate_semaphore:
+                return await self.get_board(b['id'], lists=p_lists, cards=p_cards)
+
+        hydrated = await asyncio.gather(*[hydrate(b) for b in boards], return_exceptions=True)
+
+        # a board that failed to hydrate is returned as-is with the error attached
+        results = []
+        for b, board in zip(boards, hydrated):
+            if isinstance(board, Exception):
+                logger.warning('unable to get board {}: {}({})'.format(b['id'], type(board).__name__, board))
+                board = dict(b, error='{}: {}'.format(type(board).__name__, board))
+            results.append(board)
+        return results
+
+    async def create_board(self, board_name, list_names=None, organization_id=None, members=None,
+                           template_board_id=None):
+
+        # validate board name
+        if board_name is None:
+            raise ValueError('board_name is required')
+
+        # param setup
+        p_board_name = board_name
+        p_organization_id = organization_id or self.conf.organization_id
+        p_list_names = list_names or []
+        p_members = members or []
+        p_template_board_id = template_board_id or self.conf.template_board_id
+
+        # check for duplicate names among open boards, by name only
+        boards = await self.request(
+            'GET', '/members/me/boards', params={'filter': 'open', 'fields': TRELLO_BOARD_INDEX_FIELDS})
+        dups = [b for b in boards if b['idOrganization'] == p_organization_id and fnmatch(b['name'], p_board_name)]
+        if dups:
+            raise ValueError('duplicate board_name: {}'.format(p_board_name))
+
+        # create the board
+        req_body = {
+            'name': p_board_name
+        }
+        if p_organization_id:
+            req_body['idOrganization'] = p_organization_id
+            req_body['prefs_permissionLevel'] = 'org'
+        board = None
+        if p_template_board_id:
+            template_body = dict(req_body, idBoardSource=p_template_board_id)
+            if self.conf.template_keep_from_source:
+                template_body['keepFromSource'] = self.conf.template_keep_from_source
+            try:
+                board = await self.request('POST', '/boards', data=template_body)
+            except ValueError as e:
+                if str(e) not in ['http error: {}'.format(c) for c in TEMPLATE_UNAVAILABLE_STATUS_CODES]:
+                    raise
+                logger.warning('unable to copy template board {}, creating an empty board: {}'.format(
+                    p_template_board_id, e))
+        from_template = board is not None
+        if board is None:
+            board = await self.request('POST', '/boards', data=req_body)
+
+        # add members if any are specified
+        steps = []
+        if p_members:
+            current_user = await self.request('GET', '/members/me')
+            steps.extend(
+                ('add member {}'.format(m['id']), partial(
+                    self.request,
+                    'PUT',
+                    '/boards/{board_id}/members/{member_id}'.format(board_id=board['id'], member_id=m['id']),
+                    data={'idMember': m['id'], 'type': 'normal'}
+                ))
+                for m in p_members if m['id'] != current_user['id']
+            )
+
+        if from_template:
+            # the lists came with the template, only fix them up if they aren't the ones asked for
+            await self.provision_board(board['id'], steps)
+            board = await self.get_board(board_id=board['id'])
+            if list_names is None or [l['name'] for l in board['lists']] == p_list_names:
+                return board
+            steps = self.list_steps(board['id'], board['lists'], p_list_names)
+        elif list_names is not None:
+            # if lists are specified, purge the default lists
+            lists = await self.request('GET', '/boards/{board_id}/lists'.format(board_id=board['id']))
+            steps.extend(self.list_steps(board['id'], lists, p_list_names))
+        await self.provision_board(board['id'], steps)
+
+        # get the full board
+        return await self.get_board(board_id=board['id'])
+
+    async def provision_board(self, board_id, steps):
+        """ Run independent board setup steps with up to `max_workers` at a time, see `TrelloBot.provision_board`.
+        """
+        semaphore = asyncio.Semaphore(int(self.conf.max_workers or 1))
+
+        async def run(step):
+            async with semaphore:
+                return await step()
+
+        results = await asyncio.gather(*[run(step) for _, step in steps], return_exceptions=True)
+        failures = [
+            '{}: {}'.format(desc, r) for (desc, _), r in zip(steps, results) if isinstance(r, Exception)
+        ]
+        if failures:
+            raise ValueError('board {}: {} of {} setup step(s) failed: {}'.format(
+                board_id, len(failures), len(steps), '; '.join(failures)))
+
+    def list_steps(self, board_id, lists, list_names):
+        steps = [
+            ('close list {}'.format(l['id']), partial(
+                self.request, 'PUT', '/lists/{list_id}/closed'.format(list_id=l['id']), data={'value': True}))
+            for l in lists
+        ]
+        steps.extend(
+            ('create list {}'.format(name), partial(
+                self.request, 'POST', '/boards/{board_id}/lists'.format(board_id=board_id),
+                data={'name': name, 'pos': i + 1}))
+            for i, name in enumerate(list_names)
+        )
+        return steps
+
+    async def close_board(self, board_id):
+        return await self.request('PUT', '/boards/{board_id}/closed'.format(board_id=board_id), data={'value': True})
+
+    async def update_board(self, board_id, data):
+        await self.request('PUT', '/boards/{board_id}'.format(board_id=board_id), data=data)
+        return await self.get_board(board_id=board_id)
+
+    async def update_card(self, card_id, data):
+        return await self.request('PUT', '/cards/{card_id}'.format(card_id=card_id), data=data)
+
+    async def move_all_cards(self, list_id, board_id, target_list_id):
+        return await self.request(
+            'POST',
+            '/lists/{list_id}/moveAllCards'.format(list_id=list_id),
+            data={'idBoard': board_id, 'idList': target_list_id}
+        )
@@ -1,38 +1,121 @@
 __author__ = 'ntrepid8'
 from requests_oauthlib import OAuth1
 import requests
-from agilebot import util
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
+from agilebot import defaults, util
+from agilebot.trello.cache import ResponseCache
+from agilebot.trello.scheduler import AdaptiveConcurrency, RequestScheduler, ScheduledSession
+from concurrent.futures import Future
+from contextlib import contextmanager
 import logging
 from logging import NullHandler
 from fnmatch import fnmatch
+from functools import partial
+from urllib.parse import urlencode
+import base64
+import copy
+import hashlib
+import hmac
 import json
+import threading
+import time
 logger = logging.getLogger('agilebot.lib.trello')
 logger.addHandler(NullHandler())
 TRELLO_API_BASE_URL = 'https://api.trello.com/1'
+TRELLO_BATCH_SIZE = 10
+TRELLO_BOARD_INDEX_FIELDS = 'id,name,idOrganization,closed'
+# responses to a board copy meaning the template is gone or not shared with us, and nothing was created
+TEMPLATE_UNAVAILABLE_STATUS_CODES = (400, 401, 403, 404)
+TRELLO_FIELD_PARAMS = {
+    'board': 'fields',
+    'cards': 'card_fields',
+    'lists': 'list_fields',
+    'members': 'member_fields'
+}
 
 
 class TrelloBot(object):
 
     def __init__(self, conf=None):
         self.conf = util.gen_namedtuple('Trello', self.default_conf(), conf or {})
-        self.session = requests.session()
+        self.session = ScheduledSession(self.create_scheduler(self.conf))
         self.session.headers['Accept'] = 'application/json'
 
+        # make sure the connection pool can serve every worker
+        pool_size = max(int(self.conf.max_workers or 1), DEFAULT_POOLSIZE)
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=pool_size))
+
         self.session.auth = OAuth1(
             client_key=self.conf.api_key,
             client_secret=self.conf.api_secret,
             resource_owner_key=self.conf.oauth_token,
             resource_owner_secret=self.conf.oauth_secret)
-        
+
+        # response cache, board index and request scope, anything we change on the server makes them stale
+        self.cache = None
+        if self.conf.cache_enabled:
+            self.cache = ResponseCache(
+                self.conf.cache_path,
+                ttl=self.conf.cache_ttl,
+                max_bytes=self.conf.cache_max_bytes,
+                namespace=self.conf.oauth_token or ''
+            )
+        self._board_index = None
+        self._version = 0
+        self._scope = None
+        self._scope_depth = 0
+
+        # GETs in flight, shared by every caller asking for the same url at the same time
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self.session.hooks['response'].append(self.expire_cache)
+
+        # every request actually sent, retries included
+        self._api_calls = {}
+        self._api_calls_lock = threading.Lock()
+        self.session.hooks['response'].append(self.count_api_call)
+
     @classmethod
     def default_conf(cls):
-        return {
-            'api_key': None,
-            'api_secret': None,
-            'oauth_token': None,
-            'oauth_secret': None,
-            'organization_id': None
-        }
+        return defaults.trello_conf()
+
+    @classmethod
+    def create_scheduler(cls, conf):
+        concurrency = None
+        if conf.adaptive_concurrency:
+            concurrency = AdaptiveConcurrency(
+                max_limit=int(conf.max_workers or 1),
+                latency_spike_factor=float(conf.latency_spike_factor)
+            )
+        return RequestScheduler(
+            api_key=conf.api_key,
+            oauth_token=conf.oauth_token,
+            key_limit=int(conf.rate_limit_key),
+            token_limit=int(conf.rate_limit_token),
+            interval=float(conf.rate_limit_interval),
+            max_retries=int(conf.max_retries),
+            concurrency=concurrency
+        )
+
+    def scheduler_stats(self):
+        return self.session.scheduler.stats()
+
+    def count_api_call(self, resp, *args, **kwargs):
+        with self._api_calls_lock:
+            self._api_calls[resp.request.method] = self._api_calls.get(resp.request.method, 0) + 1
+
+    def api_calls(self):
+        """ Number of API requests sent so far by HTTP method, and in `total`.
+
+        Every round trip counts, retries and batch requests included, responses served from the response cache or a
+        request scope don't.
+
+        :rtype: dict
+        """
+        with self._api_calls_lock:
+            calls = dict(self._api_calls)
+        calls['total'] = sum(calls.values())
+        return calls
 
     @classmethod
     def required_conf(cls):
@@ -53,65 +136,388 @@ class TrelloBot(object):
             if not c_ok:
                 raise ValueError('{} is required'.format(c))
 
-    def get_board(self, board_id, lists=None, cards=None):
+    def expire_cache(self, resp, *args, **kwargs):
+        if resp.request.method != 'GET':
+            self._board_index = None
+            self._version += 1
+            if self._scope is not None:
+                self._scope.clear()
+            if self.cache is not None:
+                self.cache.expire_all()
+
+    @contextmanager
+    def call_budget(self, operation, budget=None):
+        """ Log the number of API requests sent while running an operation, warning if it exceeds `budget`.
+
+        Requests sent by other threads using this bot at the same time are counted too.
+        """
+        started = self.api_calls()['total']
+        try:
+            yield
+        finally:
+            calls = self.api_calls()['total'] - started
+            if budget is not None and calls > int(budget):
+                logger.warning('{} took {} API requests, over its budget of {}'.format(operation, calls, budget))
+            else:
+                logger.debug('{} took {} API requests'.format(operation, calls))
+
+    @contextmanager
+    def request_scope(self):
+        """ Reuse GET responses for the duration of an operation.
+
+        Inside the scope a url is requested at most once until this bot changes something on the server, later
+        identical GETs get a copy of the first response. Scopes can be nested, the outermost one owns the responses.
+        """
+        with self._flights_lock:
+            if self._scope_depth == 0:
+                self._scope = {}
+            self._scope_depth += 1
+        try:
+            yield
+        finally:
+            with self._flights_lock:
+                self._scope_depth -= 1
+                if self._scope_depth == 0:
+                    self._scope = None
+
+    def get_json(self, url, params=None):
+        """ GET an API url and return the decoded response.
+
+        Identical GETs running at the same time share a single request, see also `request_scope`. Every caller
+        gets its own copy of the response, so it is safe to modify.
+        """
+        key = (url, urlencode(sorted((params or {}).items())))
+        version = self._version
+        scope = self._scope
+        if scope is not None and key in scope:
+            logger.debug('GET scoped {}'.format(url))
+            return copy.deepcopy(scope[key])
+
+        # join the request in flight or send it, a change on the server starts a new flight
+        with self._flights_lock:
+            flight = self._flights.get((version, key))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(version, key)] = {'future': Future(), 'followers': 0}
+            else:
+                flight['followers'] += 1
+        if not leader:
+            logger.debug('GET joined {}'.format(url))
+            return copy.deepcopy(flight['future'].result())
+
+        try:
+            body = self.fetch_json(url, params)
+        except Exception as e:
+            flight['future'].set_exception(e)
+            raise
+        else:
+            flight['future'].set_result(body)
+        finally:
+            with self._flights_lock:
+                del self._flights[(version, key)]
+                shared = flight['followers'] > 0
+
+        # don't keep a response fetched while something was changing
+        if scope is not None and scope is self._scope and version == self._version:
+            scope[key] = body
+            shared = True
+        return copy.deepcopy(body) if shared else body
+
+    def fetch_json(self, url, params=None):
+        """ GET an API url and return the decoded response, using the response cache if it is enabled.
+        """
+        if self.cache is None:
+            resp = self.session.get(url, params=params)
+            util.log_request_response(resp, logger)
+            if resp.status_code != requests.codes.ok:
+                raise ValueError('http error: {}'.format(resp.status_code))
+            return resp.json()
+
+        # serve fresh entries from the cache, revalidate the others
+        key = self.cache.key(url, params)
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(entry):
+            logger.debug('GET cached {}'.format(url))
+            return entry['body']
+        headers = {}
+        if entry is not None and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+
+        resp = self.session.get(url, params=params, headers=headers)
+        util.log_request_response(resp, logger)
+        if resp.status_code == requests.codes.not_modified and entry is not None:
+            # unchanged, only the time and ETag of the entry are updated
+            self.cache.revalidated(key, resp.headers.get('ETag') or entry['etag'])
+            return entry['body']
+        if resp.status_code != requests.codes.ok:
+            raise ValueError('http error: {}'.format(resp.status_code))
+        body = resp.json()
+        self.cache.put(key, url, resp.headers.get('ETag'), body)
+        return body
+
+    def board_params(self, lists=None, cards=None, fields=None):
+        """ Query parameters to get a board.
+
+        :param fields: optional projection, e.g. `{'cards': ['idList'], 'lists': ['name']}`, mapping `board`,
+                       `cards`, `lists` and `members` to the fields to return for them (ids are always returned)
+        :type fields: dict
+        """
+        params = {
+            'lists': lists or 'open',
+            'cards': cards or 'open',
+            'members': 'all'
+        }
+        for k, v in (fields or {}).items():
+            if k not in TRELLO_FIELD_PARAMS:
+                raise ValueError('invalid fields: {}'.format(k))
+            params[TRELLO_FIELD_PARAMS[k]] = ','.join(v)
+        return params
+
+    def get_board(self, board_id, lists=None, cards=None, fields=None):
 
         # ensure we have all the configuration required to make a request
         self.check_required_conf()
 
-        lists = lists or 'open'
-        cards = cards or 'open'
-
-        resp = self.session.get(
+        board = self.get_json(
             '{base_url}/boards/{board_id}'.format(base_url=TRELLO_API_BASE_URL, board_id=board_id),
-            params={
-                'lists': lists,
-                'cards': cards,
-                'members': 'all'
-            }
+            params=self.board_params(lists=lists, cards=cards, fields=fields)
         )
-        util.log_request_response(resp, logger)
-        if resp.status_code != requests.codes.ok:
-            raise ValueError('http error: {}'.format(resp.status_code))
-        board = resp.json()
         return board
 
-    def find_boards(self, board_name=None, lists=None, cards=None, organization_id=None):
+    def get_current_member(self):
+        # ensure we have all the configuration required to make a request
+        self.check_required_conf()
+
+        return self.get_json('{base_url}/members/me'.format(base_url=TRELLO_API_BASE_URL))
+
+    def iter_cards(self, board_id, card_filter=None, page_size=500, fields=None):
+        """ Iterate over the cards of a board one page at a time, so even huge boards never have to be held in
+        memory all at once.
 
+        :param card_filter: trello card filter (`open`, `closed`, `visible`, `all`), `open` by default
+        :param page_size: number of cards per request (at most 1000)
+        :param fields: card fields to return, all by default
+        :type fields: list
+        :return: generator of cards, newest first
+        """
         # ensure we have all the configuration required to make a request
         self.check_required_conf()
 
-        # param setup
-        p_name = board_name or '*'
-        p_filters = ['open']
-        p_lists = lists or 'open'
-        p_cards = cards or 'open'
-        p_organization_id = organization_id or self.conf.organization_id
+        params = {
+            'filter': card_filter or 'open',
+            'limit': page_size
+        }
+        if fields is not None:
+            params['fields'] = ','.join(fields)
 
-        resp = self.session.get(
+        while True:
+            resp = self.session.get(
+                '{base_url}/boards/{board_id}/cards'.format(base_url=TRELLO_API_BASE_URL, board_id=board_id),
+                params=params
+            )
+            util.log_request_response(resp, logger)
+            if resp.status_code != requests.codes.ok:
+                raise ValueError('http error: {}'.format(resp.status_code))
+            page = sorted(resp.json(), key=lambda c: c['id'], reverse=True)
+            for c in page:
+                yield c
+            if len(page) < page_size:
+                break
+            # card ids grow with their creation time, the next page is everything before the oldest card so far
+            params['before'] = page[-1]['id']
+
+    def get_board_activity(self, board_id):
+        """ Get the time of the latest activity on a board, a much smaller request than `get_board`.
+
+        :return: the board's `dateLastActivity`
+        :rtype: str
+        """
+        # ensure we have all the configuration required to make a request
+        self.check_required_conf()
+
+        board = self.get_json(
+            '{base_url}/boards/{board_id}'.format(base_url=TRELLO_API_BASE_URL, board_id=board_id),
+            params={'fields': 'dateLastActivity'}
+        )
+        return board.get('dateLastActivity')
+
+    def get_board_actions(self, board_id, since=None, action_types=None, limit=1000):
+        """ Get the actions on a board, oldest first.
+
+        :param since: only return actions newer than this action id (or date)
+        :param action_types: list of action types to return, all by default
+        :param limit: page size, when no `since` is given only the `limit` newest actions are returned
+        :rtype: list
+        """
+        # ensure we have all the configuration required to make a request
+        self.check_required_conf()
+
+        params = {'limit': limit}
+        if since is not None:
+            params['since'] = since
+        if action_types:
+            params['filter'] = ','.join(action_types)
+
+        # trello returns the newest actions first, page backwards until we get everything since `since`
+        actions = []
+        while True:
+            resp = self.session.get(
+                '{base_url}/boards/{board_id}/actions'.format(base_url=TRELLO_API_BASE_URL, board_id=board_id),
+                params=params
+            )
+            util.log_request_response(resp, logger)
+            if resp.status_code != requests.codes.ok:
+                raise ValueError('http error: {}'.format(resp.status_code))
+            page = resp.json()
+            actions.extend(page)
+            if since is None or len(page) < limit:
+                break
+            params['before'] = page[-1]['id']
+        actions.reverse()
+        return actions
+
+    def batch(self, urls):
+        """ GET several API urls with as few requests as possible, using the Trello /batch endpoint.
+
+        :param urls: list of API urls relative to the API base url, e.g. `/boards/{board_id}?lists=open`
+        :type urls: list
+        :return: list of `(result, error)` tuples in the same order as `urls`
+        :rtype: list
+        """
+        return list(self.iter_batch(urls))
+
+    def iter_batch(self, urls):
+        """ Like `batch`, but yield each `(result, error)` as soon as its batch request completes.
+        """
+        # ensure we have all the configuration required to make a request
+        self.check_required_conf()
+
+        def get_chunk(chunk):
+            resp = self.session.get(
+                '{base_url}/batch'.format(base_url=TRELLO_API_BASE_URL),
+                params={'urls': ','.join(chunk)}
+            )
+            util.log_request_response(resp, logger)
+            if resp.status_code != requests.codes.ok:
+                raise ValueError('http error: {}'.format(resp.status_code))
+            return resp.json()
+
+        # one batch request per chunk, up to max_workers chunks at a time
+        chunks = [urls[i:i + TRELLO_BATCH_SIZE] for i in range(0, len(urls), TRELLO_BATCH_SIZE)]
+        responses = util.iter_bounded(get_chunk, chunks, max_workers=self.conf.max_workers)
+
+        # re-expand the responses, every url in a failed chunk gets the error of the chunk
+        for chunk, (resp, err) in zip(chunks, responses):
+            if err is not None:
+                for _ in chunk:
+                    yield None, err
+                continue
+            for item in resp:
+                if str(requests.codes.ok) in item:
+                    yield item[str(requests.codes.ok)], None
+                else:
+                    yield None, ValueError('http error: {}'.format(item.get('statusCode')))
+
+    def get_boards(self, board_ids, lists=None, cards=None, fields=None):
+        """ Get several boards by id with batch requests, see `get_board`.
+
+        :return: list of boards in the same order as `board_ids`
+        :rtype: list
+        """
+        results = self.batch([
+            '/boards/{board_id}?{query}'.format(board_id=b_id, query=urlencode(self.board_params(lists, cards, fields)))
+            for b_id in board_ids
+        ])
+        for b_id, (board, err) in zip(board_ids, results):
+            if err is not None:
+                raise ValueError('board {}: {}'.format(b_id, err))
+        return [board for board, _ in results]
+
+    def get_board_index(self):
+        """ Id, name, organization and closed flag of the open boards of the current member.
+
+        The index is kept in memory for `board_index_ttl` seconds, and dropped as soon as this bot changes anything.
+
+        :rtype: list
+        """
+        index = self._board_index
+        if index is not None and time.monotonic() - index[0] < float(self.conf.board_index_ttl):
+            return index[1]
+
+        # ensure we have all the configuration required to make a request
+        self.check_required_conf()
+
+        version = self._version
+        boards = self.get_json(
             '{base_url}/members/me/boards'.format(base_url=TRELLO_API_BASE_URL),
             params={
-                'lists': p_lists,
-                'filter': ', '.join(p_filters)
+                'filter': 'open',
+                'fields': TRELLO_BOARD_INDEX_FIELDS
             }
         )
-        util.log_request_response(resp, logger)
-        if resp.status_code != requests.codes.ok:
-            raise ValueError('http error: {}'.format(resp.status_code))
-        boards = resp.json()
+        # don't keep an index fetched while something was changing
+        if version == self._version:
+            self._board_index = (time.monotonic(), boards)
+        return boards
 
-        # filter by organization_id
-        boards = [b for b in boards if b['idOrganization'] == p_organization_id]
+    def match_boards(self, board_name=None, organization_id=None):
+        """ Boards of the index in an organization, with a name matching `board_name` (supports * patterns).
 
-        # filter by name
-        boards = [b for b in boards if fnmatch(b['name'], p_name)]
+        :rtype: list
+        """
+        p_name = board_name or '*'
+        p_organization_id = organization_id or self.conf.organization_id
+        return [
+            b for b in self.get_board_index()
+            if b['idOrganization'] == p_organization_id and fnmatch(b['name'], p_name)
+        ]
 
-        # deal with cards
-        boards = [self.get_board(b['id'], lists=p_lists, cards=p_cards) for b in boards]
+    def find_boards(self, board_name=None, lists=None, cards=None, organization_id=None, fields=None):
+        return list(self.iter_boards(
+            board_name=board_name,
+            lists=lists,
+            cards=cards,
+            organization_id=organization_id,
+            fields=fields
+        ))
 
-        # return the list of boards
-        return boards
+    def iter_boards(self, board_name=None, lists=None, cards=None, organization_id=None, fields=None):
+        """ Like `find_boards`, but yield each board as soon as it has been fetched.
+        """
 
-    def create_board(self, board_name, list_names=None, organization_id=None, members=None):
+        # param setup
+        p_lists = lists or 'open'
+        p_cards = cards or 'open'
+
+        # filter by organization_id and name, without downloading the boards
+        boards = self.match_boards(board_name=board_name, organization_id=organization_id)
+
+        # deal with cards, hydrating the boards with batch requests
+        hydrated = self.iter_batch([
+            '/boards/{board_id}?{query}'.format(
+                board_id=b['id'], query=urlencode(self.board_params(p_lists, p_cards, fields)))
+            for b in boards
+        ])
+
+        # a board that failed to hydrate is returned as-is with the error attached
+        for b, (board, err) in zip(boards, hydrated):
+            if err is not None:
+                logger.warning('unable to get board {}: {}({})'.format(b['id'], type(err).__name__, err))
+                board = dict(b, error='{}: {}'.format(type(err).__name__, err))
+            yield board
+
+    def create_board(self, board_name, list_names=None, organization_id=None, members=None, template_board_id=None):
+        """ Create a board with the given lists and members.
+
+        With a template board (`template_board_id` or the `template_board_id` configuration) the board is copied
+        from the template, lists included, and its lists are only fixed up if they don't match `list_names`.
+
+        The board is put together from the responses of the requests creating it rather than fetched again, and
+        only has `members` if some were added.
+
+        :return: the new board, with its lists
+        :rtype: dict
+        """
 
         # validate board name
         if board_name is None:
@@ -125,9 +531,10 @@ class TrelloBot(object):
         p_organization_id = organization_id or self.conf.organization_id
         p_list_names = list_names or []
         p_members = members or []
+        p_template_board_id = template_board_id or self.conf.template_board_id
 
         # check for duplicate names among open boards
-        dups = self.find_boards(board_name=p_board_name, organization_id=p_organization_id)
+        dups = self.match_boards(board_name=p_board_name, organization_id=p_organization_id)
         if dups:
             raise ValueError('duplicate board_name: {}'.format(p_board_name))
 
@@ -138,76 +545,147 @@ class TrelloBot(object):
         if p_organization_id:
             req_body['idOrganization'] = p_organization_id
             req_body['prefs_permissionLevel'] = 'org'
-        resp = self.session.post(
-            '{base_url}/boards'.format(base_url=TRELLO_API_BASE_URL),
+        board = None
+        if p_template_board_id:
+            board = self.copy_board(p_template_board_id, req_body)
+        from_template = board is not None
+        if board is None:
+            # when lists are specified, don't let trello add its default lists only to close them
+            if list_names is not None:
+                req_body['defaultLists'] = False
+            board = self.post_json('{base_url}/boards'.format(base_url=TRELLO_API_BASE_URL), req_body)
+
+        # add members if any are specified
+        steps = []
+        if p_members:
+            current_user = self.get_current_member()
+            steps.extend(
+                ('add member {}'.format(m['id']), partial(self.add_board_member, board['id'], m['id']))
+                for m in p_members if m['id'] != current_user['id']
+            )
+            board['members'] = [current_user] + [m for m in p_members if m['id'] != current_user['id']]
+
+        # the lists came with the template or are trello's defaults, only replace them if they aren't the ones asked for
+        lists = []
+        if from_template or list_names is None:
+            lists = self.get_lists(board['id'])
+            if list_names is not None and [l['name'] for l in lists] != p_list_names:
+                logger.warning('lists of template board {} differ from {}, replacing them'.format(
+                    p_template_board_id, p_list_names))
+                steps.extend(self.list_steps(board['id'], lists, p_list_names))
+                lists = []
+        else:
+            steps.extend(self.list_steps(board['id'], [], p_list_names))
+        results = self.provision_board(board['id'], steps)
+
+        # a copy of the template may come with cards, which only a full board has
+        if from_template and 'cards' in (self.conf.template_keep_from_source or ''):
+            return self.get_board(board_id=board['id'])
+
+        # success
+        lists.extend(r for (desc, _), r in zip(steps, results) if desc.startswith('create list '))
+        board['lists'] = sorted(lists, key=lambda l: l.get('pos') or 0)
+        board['cards'] = []
+        return board
+
+    def provision_board(self, board_id, steps):
+        """ Run independent board setup steps with up to `max_workers` at a time.
+
+        :param steps: list of `(description, callable)` tuples
+        :return: the result of each step, in the same order as `steps`
+        :rtype: list
+        :raises ValueError: once every step has run, if any of them failed
+        """
+        results = util.map_bounded(lambda step: step[1](), steps, max_workers=self.conf.max_workers)
+        failures = ['{}: {}'.format(desc, err) for (desc, _), (_, err) in zip(steps, results) if err is not None]
+        if failures:
+            raise ValueError('board {}: {} of {} setup step(s) failed: {}'.format(
+                board_id, len(failures), len(steps), '; '.join(failures)))
+        return [r for r, _ in results]
+
+    def list_steps(self, board_id, lists, list_names):
+        """ Setup steps closing `lists` and adding lists named `list_names` to the board, in that order.
+
+        The new lists get explicit positions, so the steps can run in any order.
+        """
+        steps = [('close list {}'.format(l['id']), partial(self.close_list, l['id'])) for l in lists]
+        steps.extend(
+            ('create list {}'.format(name), partial(self.create_list, board_id, name, i + 1))
+            for i, name in enumerate(list_names)
+        )
+        return steps
+
+    def get_lists(self, board_id):
+        resp = self.session.get(
+            '{base_url}/boards/{board_id}/lists'.format(base_url=TRELLO_API_BASE_URL, board_id=board_id)
+        )
+        util.log_request_response(resp, logger)
+        if resp.status_code != requests.codes.ok:
+            raise ValueError('http error: {}'.format(resp.status_code))
+        return resp.json()
+
+    def add_board_member(self, board_id, member_id):
+        resp = self.session.put(
+            '{base_url}/boards/{board_id}/members/{member_id}'.format(
+                base_url=TRELLO_API_BASE_URL,
+                board_id=board_id,
+                member_id=member_id
+            ),
             headers={'Content-Type': 'application/json'},
-            data=json.dumps(req_body)
+            data=json.dumps({'idMember': member_id, 'type': 'normal'})
         )
         util.log_request_response(resp, logger)
         if resp.status_code != requests.codes.ok:
             raise ValueError('http error: {}'.format(resp.status_code))
-        board = resp.json()
+        return resp.json()
 
-        # get current user
-        resp = self.session.get(
-            '{base_url}/members/me'.format(base_url=TRELLO_API_BASE_URL)
+    def close_list(self, list_id):
+        resp = self.session.put(
+            '{base_url}/lists/{list_id}/closed'.format(base_url=TRELLO_API_BASE_URL, list_id=list_id),
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({'value': True})
         )
         util.log_request_response(resp, logger)
         if resp.status_code != requests.codes.ok:
             raise ValueError('http error: {}'.format(resp.status_code))
-        current_user = resp.json()
+        return resp.json()
 
-        # add members if any are specified
-        p_member_ids = [m['id'] for m in p_members if m['id'] != current_user['id']]
-        for m_id in p_member_ids:
-            resp = self.session.put(
-                '{base_url}/boards/{board_id}/members/{member_id}'.format(
-                    base_url=TRELLO_API_BASE_URL,
-                    board_id=board['id'],
-                    member_id=m_id
-                ),
-                headers={'Content-Type': 'application/json'},
-                data=json.dumps({'idMember': m_id, 'type': 'normal'})
-            )
-            util.log_request_response(resp, logger)
-            if resp.status_code != requests.codes.ok:
-                raise ValueError('http error: {}'.format(resp.status_code))
+    def create_list(self, board_id, name, pos):
+        return self.post_json(
+            '{base_url}/boards/{board_id}/lists'.format(base_url=TRELLO_API_BASE_URL, board_id=board_id),
+            {'name': name, 'pos': pos}
+        )
 
-        # if lists are specified, purge the default lists
-        if list_names is not None:
-            resp = self.session.get(
-                '{base_url}/boards/{board_id}/lists'.format(base_url=TRELLO_API_BASE_URL, board_id=board['id'])
-            )
-            util.log_request_response(resp, logger)
-            if resp.status_code != requests.codes.ok:
-                raise ValueError('http error: {}'.format(resp.status_code))
-            default_lists = resp.json()
-            for l in default_lists:
-                resp = self.session.put(
-                    '{base_url}/lists/{list_id}/closed'.format(base_url=TRELLO_API_BASE_URL, list_id=l['id']),
-                    headers={'Content-Type': 'application/json'},
-                    data=json.dumps({'value': True})
-                )
-                util.log_request_response(resp, logger)
-                if resp.status_code != requests.codes.ok:
-                    raise ValueError('http error: {}'.format(resp.status_code))
-
-        # add any lists specified
-        for i, l in enumerate(p_list_names):
-            resp = self.session.post(
-                '{base_url}/boards/{board_id}/lists'.format(base_url=TRELLO_API_BASE_URL, board_id=board['id']),
-                headers={'Content-Type': 'application/json'},
-                data=json.dumps({'name': l, 'pos': i + 1})
-            )
-            util.log_request_response(resp, logger)
-            if resp.status_code != requests.codes.ok:
-                raise ValueError('http error: {}'.format(resp.status_code))
+    def post_json(self, url, data):
+        resp = self.session.post(url, headers={'Content-Type': 'application/json'}, data=json.dumps(data))
+        util.log_request_response(resp, logger)
+        if resp.status_code != requests.codes.ok:
+            raise ValueError('http error: {}'.format(resp.status_code))
+        return resp.json()
 
-        # get the full board
-        board = self.get_board(board_id=board['id'])
+    def copy_board(self, template_board_id, data):
+        """ Create a board as a copy of a template board, keeping the template's lists but not its cards unless
+        `template_keep_from_source` says so.
 
-        # success
-        return board
+        :return: the new board, or None if the template could not be copied
+        :rtype: dict
+        """
+        req_body = dict(data, idBoardSource=template_board_id)
+        if self.conf.template_keep_from_source:
+            req_body['keepFromSource'] = self.conf.template_keep_from_source
+        resp = self.session.post(
+            '{base_url}/boards'.format(base_url=TRELLO_API_BASE_URL),
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps(req_body)
+        )
+        util.log_request_response(resp, logger)
+        if resp.status_code in TEMPLATE_UNAVAILABLE_STATUS_CODES:
+            logger.warning('unable to copy template board {}, creating an empty board: http error: {}'.format(
+                template_board_id, resp.status_code))
+            return None
+        if resp.status_code != requests.codes.ok:
+            raise ValueError('http error: {}'.format(resp.status_code))
+        return resp.json()
 
     def close_board(self, board_id):
         # ensure we have all the configuration required to make a request
@@ -224,7 +702,13 @@ class TrelloBot(object):
             raise ValueError('http error: {}'.format(resp.status_code))
         return resp.json()
 
-    def update_board(self, board_id, data):
+    def update_board(self, board_id, data, board=None):
+        """ Update the fields of a board.
+
+        :param board: the board as known locally, if given it is updated with the response instead of fetched again
+        :return: the updated board
+        :rtype: dict
+        """
         # ensure we have all the configuration required to make a request
         self.check_required_conf()
 
@@ -237,6 +721,8 @@ class TrelloBot(object):
         util.log_request_response(resp, logger)
         if resp.status_code != requests.codes.ok:
             raise ValueError('http error: {}'.format(resp.status_code))
+        if board is not None:
+            return dict(board, **resp.json())
         return self.get_board(board_id=board_id)
 
     def update_card(self, card_id, data):
@@ -253,3 +739,82 @@ class TrelloBot(object):
         if resp.status_code != requests.codes.ok:
             raise ValueError('http error: {}'.format(resp.status_code))
         return resp.json()
+
+    def move_all_cards(self, list_id, board_id, target_list_id):
+        # ensure we have all the configuration required to make a request
+        self.check_required_conf()
+
+        # move every card in the list in one request
+        resp = self.session.post(
+            '{base_url}/lists/{list_id}/moveAllCards'.format(base_url=TRELLO_API_BASE_URL, list_id=list_id),
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({'idBoard': board_id, 'idList': target_list_id})
+        )
+        util.log_request_response(resp, logger)
+        if resp.status_code != requests.codes.ok:
+            raise ValueError('http error: {}'.format(resp.status_code))
+        return resp.json()
+
+    def get_webhooks(self):
+        # ensure we have all the configuration required to make a request
+        self.check_required_conf()
+
+        # webhooks belong to the token that created them
+        resp = self.session.get(
+            '{base_url}/tokens/{token}/webhooks'.format(base_url=TRELLO_API_BASE_URL, token=self.conf.oauth_token))
+        util.log_request_response(resp, logger)
+        if resp.status_code != requests.codes.ok:
+            raise ValueError('http error: {}'.format(resp.status_code))
+        return resp.json()
+
+    def create_webhook(self, model_id, callback_url, description=None):
+        """ Ask Trello to POST the actions of a model (e.g. a board) to `callback_url`.
+
+        Trello checks the callback with a HEAD request before creating the webhook, so whatever serves
+        `callback_url` must already be running.
+        """
+        # ensure we have all the configuration required to make a request
+        self.check_required_conf()
+
+        # create the webhook
+        resp = self.session.post(
+            '{base_url}/webhooks'.format(base_url=TRELLO_API_BASE_URL),
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({
+                'idModel': model_id,
+                'callbackURL': callback_url,
+                'description': description or 'agilebot'
+            })
+        )
+        util.log_request_response(resp, logger)
+        if resp.status_code != requests.codes.ok:
+            raise ValueError('http error: {}'.format(resp.status_code))
+        return resp.json()
+
+    def delete_webhook(self, webhook_id):
+        # ensure we have all the configuration required to make a request
+        self.check_required_conf()
+
+        # delete the webhook
+        resp = self.session.delete(
+            '{base_url}/webhooks/{webhook_id}'.format(base_url=TRELLO_API_BASE_URL, webhook_id=webhook_id))
+        util.log_request_response(resp, logger)
+        if resp.status_code != requests.codes.ok:
+            raise ValueError('http error: {}'.format(resp.status_code))
+        return resp.json()
+
+    def verify_webhook(self, body, callback_url, signature):
+        """ Check the `X-Trello-Webhook` signature of a webhook request: the base64 HMAC-SHA1 of the request body
+        followed by the callback url, keyed with the api secret.
+
+        :type body: bytes
+        :rtype: bool
+        """
+        if not self.conf.api_secret or not signature:
+            return False
+        digest = hmac.new(
+            self.conf.api_secret.encode('utf-8'),
+            body + callback_url.encode('utf-8'),
+            hashlib.sha1
+        ).digest()
+        return hmac.compare_digest(base64.b64encode(digest).decode('ascii'), signature)
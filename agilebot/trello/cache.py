@@ -0,0 +1,141 @@
+__author__ = 'ntrepid8'
+from urllib.parse import urlencode
+import hashlib
+import json
+import logging
+from logging import NullHandler
+import os
+import threading
+import time
+logger = logging.getLogger('agilebot.lib.trello')
+logger.addHandler(NullHandler())
+
+
+class ResponseCache(object):
+    """ Persistent cache of decoded API responses, one JSON file per url and query string.
+
+    An entry younger than `ttl` seconds is served without a request, older entries are revalidated with their
+    ETag (If-None-Match). The cache is kept under `max_bytes` by evicting the least recently used entries.
+    `expire_all` makes every existing entry stale, e.g. after this process changed something on the server.
+
+    A revalidated entry only gets a small `.meta` file with its new time and ETag, so an unchanged response is never
+    written again.
+    """
+
+    def __init__(self, path, ttl=0, max_bytes=50 * 1024 * 1024, namespace=''):
+        self.path = os.path.expanduser(path)
+        self.ttl = float(ttl)
+        self.max_bytes = int(max_bytes)
+        self.namespace = namespace
+        self.barrier = 0.0
+        self._size = None
+        self._lock = threading.Lock()
+
+    def key(self, url, params=None):
+        url_hash = hashlib.sha1('{} {}'.format(self.namespace, url).encode('utf-8')).hexdigest()
+        params_hash = hashlib.sha1(urlencode(sorted((params or {}).items())).encode('utf-8')).hexdigest()
+        return '{}-{}'.format(url_hash, params_hash)
+
+    def entry_path(self, key):
+        return os.path.join(self.path, '{}.json'.format(key))
+
+    def meta_path(self, key):
+        return os.path.join(self.path, '{}.meta'.format(key))
+
+    def get(self, key):
+        """ Get a cache entry.
+
+        :return: `{'url', 'etag', 'stored', 'body'}` or None if there is no entry for `key`
+        :rtype: dict
+        """
+        try:
+            with open(self.entry_path(key)) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        try:
+            with open(self.meta_path(key)) as f:
+                meta = json.load(f)
+        except (IOError, OSError, ValueError):
+            meta = None
+        if meta is not None and meta['stored'] > entry['stored']:
+            entry.update(meta)
+        self.touch(key)
+        return entry
+
+    def is_fresh(self, entry):
+        return entry['stored'] > self.barrier and time.time() - entry['stored'] < self.ttl
+
+    def touch(self, key):
+        try:
+            os.utime(self.entry_path(key), None)
+        except OSError:
+            pass
+
+    def put(self, key, url, etag, body):
+        entry = {
+            'url': url,
+            'etag': etag,
+            'stored': time.time(),
+            'body': body
+        }
+        data = json.dumps(entry)
+        path = self.entry_path(key)
+        with self._lock:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            self.write(path, data)
+            self.remove(self.meta_path(key))
+            if self._size is not None:
+                self._size += len(data) - old_size
+        self.evict()
+
+    def revalidated(self, key, etag):
+        """ Mark an entry as fresh again after a 304 response, without rewriting its body.
+        """
+        with self._lock:
+            if os.path.exists(self.entry_path(key)):
+                self.write(self.meta_path(key), json.dumps({'etag': etag, 'stored': time.time()}))
+
+    def write(self, path, data):
+        tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def expire_all(self):
+        self.barrier = time.time()
+
+    def evict(self):
+        """ Remove the least recently used entries until the cache fits in `max_bytes`.
+        """
+        with self._lock:
+            if self._size is not None and self._size <= self.max_bytes:
+                return
+            entries = []
+            for name in os.listdir(self.path):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    st = os.stat(os.path.join(self.path, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+            self._size = sum(e[1] for e in entries)
+            for _, size, name in sorted(entries):
+                if self._size <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    continue
+                self.remove(os.path.join(self.path, '{}.meta'.format(name[:-len('.json')])))
+                self._size -= size
+                logger.debug('evicted cached response: {}'.format(name))
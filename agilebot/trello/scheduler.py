@@ -0,0 +1,229 @@
+__author__ = 'ntrepid8'
+import requests
+from agilebot import ratelimit
+import logging
+from logging import NullHandler
+import random
+import threading
+import time
+logger = logging.getLogger('agilebot.lib.trello')
+logger.addHandler(NullHandler())
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+
+class AdaptiveConcurrency(object):
+    """ AIMD controller for the number of in-flight requests.
+
+    The limit grows additively (by about one request per limit's worth of healthy responses) while latency and
+    errors stay healthy, and is cut multiplicatively on throttling (429), server errors (5xx), connection errors or
+    a latency spike, i.e. a response slower than `latency_spike_factor` times the moving average latency.
+    """
+
+    def __init__(self, max_limit, min_limit=1, initial_limit=None, decrease_factor=0.5,
+                 latency_spike_factor=3.0, latency_alpha=0.2):
+        self.max_limit = max(int(max_limit), 1)
+        self.min_limit = max(min(int(min_limit), self.max_limit), 1)
+        self.limit = float(initial_limit or max(self.max_limit // 2, self.min_limit))
+        self.decrease_factor = float(decrease_factor)
+        self.latency_spike_factor = float(latency_spike_factor)
+        self.latency_alpha = float(latency_alpha)
+        self.latency_avg = None
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency, status_code=None, error=None):
+        with self.condition:
+            self.in_flight -= 1
+            reason = self.unhealthy_reason(latency, status_code, error)
+            if reason is not None:
+                self.decrease(reason)
+            else:
+                self.increase()
+            self.condition.notify_all()
+
+    def unhealthy_reason(self, latency, status_code, error):
+        if error is not None:
+            return 'connection error: {}'.format(type(error).__name__)
+        if status_code == requests.codes.too_many_requests or status_code in RETRY_STATUS_CODES:
+            return 'http {}'.format(status_code)
+        latency_avg = self.latency_avg
+        self.latency_avg = latency if latency_avg is None else (
+            self.latency_alpha * latency + (1 - self.latency_alpha) * latency_avg)
+        if latency_avg is not None and latency > latency_avg * self.latency_spike_factor:
+            return 'latency spike: {:.3f}s (average {:.3f}s)'.format(latency, latency_avg)
+        return None
+
+    def increase(self):
+        old_limit = int(self.limit)
+        self.limit = min(self.limit + 1.0 / self.limit, float(self.max_limit))
+        if int(self.limit) != old_limit:
+            logger.debug('concurrency limit increased to {}'.format(int(self.limit)))
+
+    def decrease(self, reason):
+        # responses already in flight when we backed off reflect the old limit, only back off once per window
+        now = time.monotonic()
+        if now - self.last_decrease < (self.latency_avg or 0.0):
+            return
+        self.last_decrease = now
+        old_limit = int(self.limit)
+        self.limit = max(self.limit * self.decrease_factor, float(self.min_limit))
+        logger.info('concurrency limit decreased from {} to {} ({})'.format(old_limit, int(self.limit), reason))
+
+
+class RequestScheduler(object):
+    """ Schedule Trello API requests within the per-key and per-token rate limits.
+
+    Every request takes a token from the API key bucket and from the OAuth token bucket, waiting when either is
+    empty. Throttled requests (429) are retried after `Retry-After`, and idempotent requests are also retried on
+    connection errors and 5xx responses, with jittered exponential backoff.
+    """
+
+    def __init__(self, api_key=None, oauth_token=None, key_limit=300, token_limit=100, interval=10,
+                 max_retries=5, backoff_base=0.5, backoff_max=30.0, concurrency=None):
+        self.concurrency = concurrency
+        self.key_bucket = ratelimit.get_bucket(('trello.key', api_key), key_limit, interval)
+        self.token_bucket = ratelimit.get_bucket(('trello.token', oauth_token), token_limit, interval)
+        self.max_retries = int(max_retries)
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self._stats = {
+            'requests': 0,
+            'responses': {},
+            'retries': 0,
+            'throttled': 0,
+            'errors': 0,
+            'wait_seconds': 0.0,
+            'backoff_seconds': 0.0
+        }
+        self._stats_lock = threading.Lock()
+
+    def stats(self):
+        """ Counters describing the scheduled requests so far.
+
+        :rtype: dict
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats['responses'] = dict(self._stats['responses'])
+        if self.concurrency is not None:
+            stats['concurrency_limit'] = int(self.concurrency.limit)
+            stats['in_flight'] = self.concurrency.in_flight
+        return stats
+
+    def record(self, key, value=1):
+        with self._stats_lock:
+            self._stats[key] += value
+
+    def record_response(self, status_code):
+        with self._stats_lock:
+            self._stats['responses'][status_code] = self._stats['responses'].get(status_code, 0) + 1
+
+    def reserve(self):
+        """ Reserve a request slot in both rate limits.
+
+        :return: number of seconds to wait before sending the request
+        :rtype: float
+        """
+        wait = max(self.key_bucket.reserve(), self.token_bucket.reserve())
+        self.record('requests')
+        self.record('wait_seconds', wait)
+        return wait
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def retry_delay(self, method, attempt, status_code=None, retry_after=None, error=None):
+        """ Decide whether a request should be retried.
+
+        :return: number of seconds to wait before retrying, or None if the request should not be retried
+        :rtype: float
+        """
+        if error is None:
+            self.record_response(status_code)
+        else:
+            self.record('errors')
+        if attempt >= self.max_retries:
+            return None
+
+        if status_code == requests.codes.too_many_requests:
+            # throttled requests were never processed, so they are safe to retry whatever the method
+            self.record('throttled')
+            delay = ratelimit.parse_retry_after(retry_after)
+            if delay is None:
+                delay = self.backoff(attempt)
+            self.key_bucket.drain(delay)
+            self.token_bucket.drain(delay)
+            logger.warning('throttled by Trello, retrying {} in {:.2f}s'.format(method, delay))
+        elif method.upper() in IDEMPOTENT_METHODS and (error is not None or status_code in RETRY_STATUS_CODES):
+            delay = self.backoff(attempt)
+            logger.debug('retrying {} in {:.2f}s after {}'.format(method, delay, error or status_code))
+        else:
+            return None
+
+        self.record('retries')
+        self.record('backoff_seconds', delay)
+        return delay
+
+    def send(self, method, send_request):
+        """ Send a request through the scheduler, retrying it when appropriate.
+
+        :param method: HTTP method of the request
+        :param send_request: callable sending the request and returning a `requests.Response`
+        :rtype: requests.Response
+        """
+        attempt = 0
+        while True:
+            time.sleep(self.reserve())
+            try:
+                resp = self.send_once(send_request)
+            except requests.ConnectionError as e:
+                delay = self.retry_delay(method, attempt, error=e)
+                if delay is None:
+                    raise
+            else:
+                delay = self.retry_delay(
+                    method, attempt, status_code=resp.status_code, retry_after=resp.headers.get('Retry-After'))
+                if delay is None:
+                    return resp
+                resp.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def send_once(self, send_request):
+        if self.concurrency is None:
+            return send_request()
+        self.concurrency.acquire()
+        started = time.monotonic()
+        try:
+            resp = send_request()
+        except requests.ConnectionError as e:
+            self.concurrency.release(time.monotonic() - started, error=e)
+            raise
+        except Exception:
+            self.concurrency.release(time.monotonic() - started)
+            raise
+        self.concurrency.release(time.monotonic() - started, status_code=resp.status_code)
+        return resp
+
+
+class ScheduledSession(requests.Session):
+    """ requests session sending every request through a :class:`RequestScheduler`.
+    """
+
+    def __init__(self, scheduler):
+        super(ScheduledSession, self).__init__()
+        self.scheduler = scheduler
+
+    def request(self, method, url, *args, **kwargs):
+        return self.scheduler.send(
+            method,
+            lambda: super(ScheduledSession, self).request(method, url, *args, **kwargs)
+        )
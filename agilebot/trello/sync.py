@@ -0,0 +1,161 @@
+__author__ = 'ntrepid8'
+import logging
+from logging import NullHandler
+logger = logging.getLogger('agilebot.lib.trello')
+logger.addHandler(NullHandler())
+
+# actions that change the open lists, cards and members of a board
+SYNC_ACTION_TYPES = [
+    'createCard',
+    'copyCard',
+    'convertToCardFromCheckItem',
+    'emailCard',
+    'moveCardToBoard',
+    'updateCard',
+    'deleteCard',
+    'moveCardFromBoard',
+    'addMemberToCard',
+    'removeMemberFromCard',
+    'addLabelToCard',
+    'removeLabelFromCard',
+    'createList',
+    'moveListToBoard',
+    'updateList',
+    'moveListFromBoard',
+    'updateBoard',
+    'addMemberToBoard',
+    'removeMemberFromBoard'
+]
+
+
+def find_by_id(items, item_id):
+    return next((i for i in items if i['id'] == item_id), None)
+
+
+def remove_by_id(items, item_id):
+    items[:] = [i for i in items if i['id'] != item_id]
+
+
+def apply_changes(obj, data, old):
+    """ Copy the fields listed in an action's `old` values from the action's new values to `obj`.
+    """
+    for k in old.keys():
+        if k in data:
+            obj[k] = data[k]
+
+
+def add_card(board, data):
+    card = find_by_id(board['cards'], data['card']['id'])
+    if card is None:
+        card = {'idBoard': board['id'], 'closed': False, 'idMembers': [], 'idLabels': []}
+        board['cards'].append(card)
+    card.update(data['card'])
+    if 'list' in data:
+        card['idList'] = data['list']['id']
+    return card
+
+
+def update_card(board, data):
+    card = find_by_id(board['cards'], data['card']['id'])
+    if card is None:
+        # only an archived card coming back is added, other updates of a card we don't have are for archived cards
+        if data['card'].get('closed') is False:
+            card = add_card(board, data)
+        else:
+            return
+    apply_changes(card, data['card'], data.get('old', {}))
+    if 'listAfter' in data:
+        card['idList'] = data['listAfter']['id']
+    if card.get('closed'):
+        remove_by_id(board['cards'], card['id'])
+
+
+def update_card_ids(board, data, key, item_id, add):
+    card = find_by_id(board['cards'], data['card']['id'])
+    if card is None or item_id is None:
+        return
+    ids = card.setdefault(key, [])
+    if add and item_id not in ids:
+        ids.append(item_id)
+    elif not add and item_id in ids:
+        ids.remove(item_id)
+
+
+def add_list(board, data):
+    l = find_by_id(board['lists'], data['list']['id'])
+    if l is None:
+        l = {'idBoard': board['id'], 'closed': False}
+        board['lists'].append(l)
+    l.update(data['list'])
+
+
+def update_list(board, data):
+    l = find_by_id(board['lists'], data['list']['id'])
+    if l is None:
+        if data['list'].get('closed') is False:
+            add_list(board, data)
+        return
+    apply_changes(l, data['list'], data.get('old', {}))
+    if l.get('closed'):
+        remove_by_id(board['lists'], l['id'])
+
+
+def apply_action(board, action):
+    """ Apply a single Trello action to a board snapshot with open lists and cards.
+
+    :return: True if the action type is supported
+    :rtype: bool
+    """
+    a_type = action['type']
+    data = action.get('data', {})
+    if a_type in ('createCard', 'copyCard', 'convertToCardFromCheckItem', 'emailCard', 'moveCardToBoard'):
+        add_card(board, data)
+    elif a_type == 'updateCard':
+        update_card(board, data)
+    elif a_type in ('deleteCard', 'moveCardFromBoard'):
+        remove_by_id(board['cards'], data['card']['id'])
+    elif a_type in ('addMemberToCard', 'removeMemberFromCard'):
+        update_card_ids(board, data, 'idMembers', data.get('idMember'), a_type == 'addMemberToCard')
+    elif a_type in ('addLabelToCard', 'removeLabelFromCard'):
+        update_card_ids(board, data, 'idLabels', data.get('label', {}).get('id'), a_type == 'addLabelToCard')
+    elif a_type in ('createList', 'moveListToBoard'):
+        add_list(board, data)
+    elif a_type == 'updateList':
+        update_list(board, data)
+    elif a_type == 'moveListFromBoard':
+        remove_by_id(board['lists'], data['list']['id'])
+        board['cards'] = [c for c in board['cards'] if c.get('idList') != data['list']['id']]
+    elif a_type == 'updateBoard':
+        apply_changes(board, data.get('board', {}), data.get('old', {}))
+    elif a_type == 'addMemberToBoard':
+        member = action.get('member') or {'id': data.get('idMemberAdded')}
+        if member.get('id') and find_by_id(board['members'], member['id']) is None:
+            board['members'].append(member)
+    elif a_type == 'removeMemberFromBoard':
+        remove_by_id(board['members'], (action.get('member') or {}).get('id') or data.get('idMember'))
+    else:
+        return False
+    return True
+
+
+def apply_actions(board, actions):
+    """ Apply Trello actions, oldest first, to a board snapshot as returned by `TrelloBot.get_board`.
+
+    :param board: board with `lists`, `cards` and `members`, updated in place
+    :param actions: list of actions sorted from oldest to newest
+    :return: the updated board
+    :rtype: dict
+    """
+    for k in ('lists', 'cards', 'members'):
+        board.setdefault(k, [])
+    for action in actions:
+        try:
+            applied = apply_action(board, action)
+        except KeyError as e:
+            logger.warning('unable to apply {} action {}: missing {}'.format(action.get('type'), action.get('id'), e))
+            continue
+        if not applied:
+            logger.debug('ignoring {} action {}'.format(action.get('type'), action.get('id')))
+        if action.get('date'):
+            board['dateLastActivity'] = action['date']
+    return board
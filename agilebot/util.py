@@ -1,13 +1,15 @@
 __author__ = 'ntrepid8'
-from collections import namedtuple, Mapping
+from collections import namedtuple
+from collections.abc import Mapping
 import os
-import calendar
 import time
 import traceback
 import json
-import requests
+from collections import deque
+from datetime import date
 
 DUMP_PATH = '/tmp/agilebot_dumps'
+DEFAULT_SPRINT_NAME_TPL = 'Sprint {iso_year}.{iso_week}'
 
 
 def dump_resp(resp):
@@ -17,14 +19,28 @@ def dump_resp(resp):
         dump_path=DUMP_PATH,
         method=resp.request.method,
         code=resp.status_code,
-        time_stamp=calendar.timegm(time.gmtime()))
+        time_stamp=int(time.time()))
     with open('{dump_path}/{method}_{code}_{time_stamp}.log'.format(**dp_kwargs), 'w') as f:
-        json.dump(vars(resp), f, sort_keys=True, indent=4)
+        json.dump(vars(resp), f, sort_keys=True, indent=4, default=str)
+
+
+def get_base_path():
+    return os.path.expanduser(os.environ.get('AB_BASE_PATH', '~/.agilebot.d'))
+
+
+def format_sprint_name(sprint_name=None, iso_year=None, iso_week=None):
+    sprint_name = sprint_name or DEFAULT_SPRINT_NAME_TPL
+    iso_date = date.today().isocalendar()
+    sn_kwargs = dict(
+        iso_year=iso_year or iso_date[0],
+        iso_week=iso_week or iso_date[1]
+    )
+    return sprint_name.format(**sn_kwargs)
 
 
 def log_request_response(resp, logger):
     trigger_dump = False
-    if resp.status_code != requests.codes.ok:
+    if resp.status_code not in (200, 304):
         trigger_dump = True
     # TODO - sometimes 'method' is not available, handle this condition
     orig_request = getattr(resp, 'request', None)
@@ -77,7 +93,8 @@ def left_merge(left, right):
             if isinstance(v, Mapping):
                 new_left[k] = left_merge(left[k], right.get(k, {}))
             else:
-                new_left[k] = right.get(k) or left[k]
+                # keep falsy values such as `false` or `0`, only a missing or null value falls back to the default
+                new_left[k] = get_first_value(right.get(k), left[k])
         return new_left
 
 
@@ -85,6 +102,54 @@ def get_first_value(*args):
     return next((i for i in args if i is not None), None)
 
 
+def iter_bounded(func, items, max_workers=None):
+    """ Call `func` on every item in `items` using at most `max_workers` threads, yielding each result as soon as
+    it and the results before it are available.
+
+    No more than `max_workers` calls are in flight or waiting to be consumed at any time, so memory stays bounded
+    however many items there are. Errors are captured per item instead of being raised, so one failure does not
+    abort the others.
+
+    :param func: callable taking a single item
+    :param items: iterable of items
+    :param max_workers: maximum number of concurrent calls (1 or less runs the calls sequentially)
+    :type max_workers: int
+    :return: generator of `(result, error)` tuples in the same order as `items`
+    """
+    def call(item):
+        try:
+            return func(item), None
+        except Exception as e:
+            return None, e
+
+    max_workers = int(max_workers or 1)
+    if max_workers <= 1:
+        for i in items:
+            yield call(i)
+        return
+
+    # imported here so the command line doesn't pay for it unless a command runs requests in parallel
+    from concurrent.futures import ThreadPoolExecutor
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque(executor.submit(call, i) for _, i in zip(range(max_workers), items))
+        while pending:
+            result = pending.popleft().result()
+            for i in items:
+                pending.append(executor.submit(call, i))
+                break
+            yield result
+
+
+def map_bounded(func, items, max_workers=None):
+    """ Call `func` on every item in `items` using at most `max_workers` threads, see `iter_bounded`.
+
+    :return: list of `(result, error)` tuples in the same order as `items`
+    :rtype: list
+    """
+    return list(iter_bounded(func, items, max_workers=max_workers))
+
+
 def update_config_group(group_name, args, conf):
     for k, v in conf[group_name].items():
         val = getattr(args, k, None)
@@ -96,7 +161,7 @@ def update_config_group(group_name, args, conf):
 def dump_trace(error_class, error_str, exc_info):
     if not os.path.exists(DUMP_PATH):
         os.makedirs(DUMP_PATH)
-    dp_kwargs = dict(dump_path=DUMP_PATH, error_class=error_class, time_stamp=calendar.timegm(time.gmtime()))
+    dp_kwargs = dict(dump_path=DUMP_PATH, error_class=error_class, time_stamp=int(time.time()))
     with open('{dump_path}/{time_stamp}_{error_class}.log'.format(**dp_kwargs), 'w') as f:
         f.write('{error_class}: {error_str}\n'.format(
             error_class=error_class,
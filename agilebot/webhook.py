@@ -0,0 +1,153 @@
+__author__ = 'ntrepid8'
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import logging
+from logging import NullHandler
+import os
+import threading
+import uuid
+logger = logging.getLogger('agilebot.lib.webhook')
+logger.addHandler(NullHandler())
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+
+    def send_json(self, status, body=None):
+        data = json.dumps(body or {}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def do_HEAD(self):
+        # trello checks the callback url with a HEAD request before creating a webhook
+        self.send_json(200)
+
+    def do_GET(self):
+        self.send_json(200, self.server.receiver.status())
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        status, result = self.server.receiver.handle(body, self.headers.get('X-Trello-Webhook'))
+        self.send_json(status, result)
+
+    def log_message(self, format, *args):
+        logger.debug('{} {}'.format(self.address_string(), format % args))
+
+
+class WebhookReceiver(object):
+    """ Keep the stored boards of the active and closing sprints up to date from Trello webhooks.
+
+    On start the receiver registers a webhook for each sprint board, syncs the boards and marks the sprints live,
+    so `AgileBot.get_active_sprint` and `get_closing_sprint` use the stored boards without any API call while the
+    receiver runs. Every action Trello POSTs is applied to the stored board as it arrives.
+    """
+
+    def __init__(self, bot, host='127.0.0.1', port=8321, callback_url=None, verify=True):
+        if not callback_url:
+            raise ValueError('callback_url is required')
+        if verify and not bot.trello.conf.api_secret:
+            raise ValueError('api_secret is required to verify webhook requests')
+        self.bot = bot
+        self.callback_url = callback_url
+        self.verify = verify
+        self.server = HTTPServer((host, int(port)), WebhookHandler)
+        self.server.receiver = self
+        self.webhooks = {}
+        self.actions = 0
+        self.lock = threading.Lock()
+
+        # identifies this receiver to the processes checking whether the sprints are live
+        self.instance = uuid.uuid4().hex
+
+    def sprint_paths(self):
+        return [self.bot.conf['sprint']['active_sprint_path'], self.bot.conf['sprint']['closing_sprint_path']]
+
+    def status_url(self):
+        host, port = self.server.server_address[:2]
+        if host in ('', '0.0.0.0'):
+            host = '127.0.0.1'
+        return 'http://{}:{}/'.format(host, port)
+
+    def status(self):
+        return {
+            'instance': self.instance,
+            'pid': os.getpid(),
+            'callback_url': self.callback_url,
+            'webhooks': self.webhooks,
+            'actions': self.actions
+        }
+
+    def handle(self, body, signature=None):
+        """ Handle a request POSTed by Trello.
+
+        :return: `(http status, response body)`
+        :rtype: tuple
+        """
+        if self.verify and not self.bot.trello.verify_webhook(body, self.callback_url, signature):
+            logger.warning('rejected webhook request with an invalid signature')
+            return 401, {'error': 'invalid signature'}
+        try:
+            payload = json.loads(body.decode('utf-8'))
+            action = payload['action']
+            board_id = payload.get('model', {}).get('id') or action['data']['board']['id']
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {'error': 'invalid payload: {}'.format(e)}
+
+        with self.lock:
+            sprint_path = self.bot.apply_board_action(board_id, action)
+            self.actions += 1
+        if sprint_path is None:
+            # no sprint uses the board anymore, 410 tells trello to delete the webhook
+            logger.info('board {} is not a sprint board anymore'.format(board_id))
+            return 410, {'error': 'unknown board'}
+        logger.debug('applied {} action {} to {}'.format(action.get('type'), action.get('id'), sprint_path))
+        return 200, {'applied': action.get('id')}
+
+    def start(self):
+        """ Start serving in a background thread, then register the webhooks and sync the sprint boards.
+        """
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logger.info('listening on {}:{}'.format(*self.server.server_address[:2]))
+
+        existing = dict(
+            (w['idModel'], w) for w in self.bot.trello.get_webhooks() if w.get('callbackURL') == self.callback_url)
+        for sprint_path in self.sprint_paths():
+            sprint = self.bot.load_sprint(sprint_path)
+            if sprint is None or not sprint.get('trello_board'):
+                continue
+            board_id = sprint['trello_board']['id']
+            webhook = existing.get(board_id) or self.bot.trello.create_webhook(
+                board_id, self.callback_url, description='agilebot {}'.format(sprint['name']))
+            self.webhooks[board_id] = webhook['id']
+
+            # from here on every change reaches us, catch up on what happened before
+            with self.lock:
+                sprint = self.bot.sync_sprint(sprint_path)
+                sprint['webhook'] = {
+                    'id': webhook['id'],
+                    'pid': os.getpid(),
+                    'instance': self.instance,
+                    'status_url': self.status_url(),
+                    'callback_url': self.callback_url
+                }
+                self.bot.save_sprint(sprint_path, sprint)
+            logger.info('webhook {} keeps {} up to date'.format(webhook['id'], sprint['name']))
+
+    def stop(self):
+        """ Stop serving, delete the webhooks and mark the sprints as no longer live.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        for sprint_path in self.sprint_paths():
+            sprint = self.bot.load_sprint(sprint_path)
+            if sprint is not None and sprint.pop('webhook', None) is not None:
+                self.bot.save_sprint(sprint_path, sprint)
+        for board_id, webhook_id in self.webhooks.items():
+            try:
+                self.bot.trello.delete_webhook(webhook_id)
+            except Exception as e:
+                logger.warning('unable to delete webhook {} of board {}: {}'.format(webhook_id, board_id, e))
+        self.webhooks = {}
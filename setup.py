@@ -24,5 +24,8 @@ setup(
         'requests-oauthlib',
         'pytoml',
         'colorlog'
-    ]
+    ],
+    extras_require={
+        'async': ['aiohttp']
+    }
 )
@@ -0,0 +1,123 @@
+__author__ = 'ntrepid8'
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import itertools
+import json
+import re
+import threading
+
+
+class FakeTrello(object):
+    """ Just enough of the Trello API, served on localhost, to create boards and roll a sprint over.
+    """
+
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.boards = {}
+        self.lists = {}
+        self.cards = {}
+        self.me = {'id': 'm0', 'username': 'me', 'fullName': 'Me'}
+        self.requests = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeTrelloHandler)
+        self.server.trello = self
+        self.base_url = 'http://127.0.0.1:{}/1'.format(self.server.server_address[1])
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def new_id(self):
+        return '{:024x}'.format(next(self.ids))
+
+    def add_board(self, name, list_names=(), members=('m0',), cards_per_list=0):
+        board = {'id': self.new_id(), 'name': name, 'closed': False, 'idOrganization': None,
+                 'dateLastActivity': '2026-01-01T00:00:00.000Z', 'members': [{'id': m, 'username': m} for m in members]}
+        self.boards[board['id']] = board
+        for pos, list_name in enumerate(list_names, 1):
+            l = self.add_list(board['id'], list_name, pos)
+            for i in range(cards_per_list):
+                card = {'id': self.new_id(), 'name': '{} {}'.format(list_name, i), 'idBoard': board['id'],
+                        'idList': l['id'], 'closed': False}
+                self.cards[card['id']] = card
+        return board
+
+    def add_list(self, board_id, name, pos):
+        l = {'id': self.new_id(), 'name': name, 'idBoard': board_id, 'closed': False, 'pos': pos}
+        self.lists[l['id']] = l
+        return l
+
+    def board_json(self, board_id, query):
+        board = {k: v for k, v in self.boards[board_id].items() if k != 'members'}
+        board['lists'] = sorted(
+            [l for l in self.lists.values() if l['idBoard'] == board_id and not l['closed']], key=lambda l: l['pos'])
+        if query.get('cards', ['open'])[0] != 'none':
+            board['cards'] = [c for c in self.cards.values() if c['idBoard'] == board_id and not c['closed']]
+        if query.get('members', ['none'])[0] != 'none':
+            board['members'] = self.boards[board_id]['members']
+        return board
+
+    def route(self, method, path, query, body):
+        m = re.fullmatch
+        if method == 'GET' and path == '/members/me':
+            return self.me
+        if method == 'GET' and path == '/members/me/boards':
+            return [{k: b[k] for k in ('id', 'name', 'idOrganization', 'closed')} for b in self.boards.values()]
+        if method == 'POST' and path == '/boards':
+            board = self.add_board(body['name'], members=(self.me['id'],))
+            if body.get('defaultLists') is not False:
+                for pos, name in enumerate(('To Do', 'Doing', 'Done'), 1):
+                    self.add_list(board['id'], name, pos)
+            return {k: v for k, v in board.items() if k != 'members'}
+        r = m(r'/boards/(\w+)', path)
+        if r and method == 'GET':
+            return self.board_json(r.group(1), query)
+        if r and method == 'PUT':
+            self.boards[r.group(1)].update(body)
+            return {k: v for k, v in self.boards[r.group(1)].items() if k != 'members'}
+        r = m(r'/boards/(\w+)/members/(\w+)', path)
+        if r and method == 'PUT':
+            self.boards[r.group(1)]['members'].append({'id': r.group(2), 'username': r.group(2)})
+            return {'id': r.group(1)}
+        r = m(r'/boards/(\w+)/lists', path)
+        if r and method == 'GET':
+            return self.board_json(r.group(1), {'cards': ['none']})['lists']
+        if r and method == 'POST':
+            return self.add_list(r.group(1), body['name'], body['pos'])
+        r = m(r'/lists/(\w+)/closed', path)
+        if r and method == 'PUT':
+            self.lists[r.group(1)]['closed'] = True
+            return self.lists[r.group(1)]
+        r = m(r'/lists/(\w+)/moveAllCards', path)
+        if r and method == 'POST':
+            moved = [c for c in self.cards.values() if c['idList'] == r.group(1) and not c['closed']]
+            for c in moved:
+                c.update(idBoard=body['idBoard'], idList=body['idList'])
+            return moved
+        return None
+
+
+class FakeTrelloHandler(BaseHTTPRequestHandler):
+
+    def handle_request(self):
+        trello = self.server.trello
+        url = urlparse(self.path)
+        path = url.path[len('/1'):]
+        data = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with trello.lock:
+            trello.requests.append((self.command, path))
+            result = trello.route(self.command, path, parse_qs(url.query), json.loads(data.decode('utf-8') or '{}'))
+        body = json.dumps(result if result is not None else {'message': 'not found'}).encode('utf-8')
+        self.send_response(200 if result is not None else 404)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = handle_request
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,76 @@
+__author__ = 'ntrepid8'
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from agilebot import defaults
+from agilebot.agilebot import AgileBot
+from agilebot.trello import bot as trello_bot
+from tests.fake_trello import FakeTrello
+
+SPRINT_LISTS = ['To Do', 'In Progress', 'Completed', 'Deployed']
+
+# GET closing board, GET board index, POST board, GET current member, PUT member, POST 4 lists, PUT closing board
+# name, POST 2 list moves
+ROLLOVER_CALLS = 12
+
+
+class RolloverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.trello = FakeTrello()
+        self.trello.start()
+        patcher = mock.patch.object(trello_bot, 'TRELLO_API_BASE_URL', self.trello.base_url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        conf = defaults.agilebot_conf()
+        conf['sprint']['active_sprint_path'] = os.path.join(self.tmp.name, 'sprint_active.json')
+        conf['sprint']['closing_sprint_path'] = os.path.join(self.tmp.name, 'sprint_closing.json')
+        conf['store']['path'] = os.path.join(self.tmp.name, 'agilebot.db')
+        conf['trello'].update(
+            api_key='key', api_secret='secret', oauth_token='token', oauth_secret='secret', cache_enabled=False)
+        conf['sprint']['rollover_call_budget'] = ROLLOVER_CALLS
+        self.bot = AgileBot(**conf)
+
+        self.closing_board = self.trello.add_board(
+            'Sprint 1 (active)', SPRINT_LISTS, members=('m0', 'm1'), cards_per_list=5)
+        with open(conf['sprint']['active_sprint_path'], 'w') as f:
+            json.dump({'name': self.closing_board['name'], 'trello_board': {'id': self.closing_board['id']}}, f)
+
+    def tearDown(self):
+        self.trello.stop()
+        self.tmp.cleanup()
+
+    def test_rollover_api_calls(self):
+        with self.assertLogs('agilebot.lib.trello', 'DEBUG') as logs:
+            new_sprint = self.bot.start_new_sprint(sprint_name='Sprint 2')
+
+        calls = self.bot.trello.api_calls()
+        self.assertEqual(calls['total'], ROLLOVER_CALLS, self.trello.requests)
+        self.assertEqual(calls['GET'], 3)
+        self.assertEqual(len(self.trello.requests), ROLLOVER_CALLS)
+        self.assertFalse(any('over its budget' in line for line in logs.output), logs.output)
+
+        # nothing was fetched again after being created or changed
+        new_board_id = new_sprint['trello_board']['id']
+        self.assertNotIn(('GET', '/boards/{}'.format(new_board_id)), self.trello.requests)
+        self.assertNotIn(('GET', '/boards/{}/lists'.format(new_board_id)), self.trello.requests)
+        self.assertEqual(self.trello.requests.count(('GET', '/boards/{}'.format(self.closing_board['id']))), 1)
+
+        self.assertEqual([l['name'] for l in new_sprint['trello_board']['lists']], SPRINT_LISTS)
+        self.assertEqual(len(new_sprint['migrated_cards']), 10)
+        self.assertTrue(all(r['success'] for r in new_sprint['migrated_cards']))
+
+    def test_rollover_over_budget(self):
+        self.bot.conf['sprint']['rollover_call_budget'] = ROLLOVER_CALLS - 1
+        with self.assertLogs('agilebot.lib.trello', 'WARNING') as logs:
+            self.bot.start_new_sprint(sprint_name='Sprint 2')
+        self.assertIn('sprint rollover took {} API requests, over its budget of {}'.format(
+            ROLLOVER_CALLS, ROLLOVER_CALLS - 1), logs.output[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+__author__ = 'ntrepid8'
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules a command that doesn't talk to any API must not pay for at startup
+NETWORK_MODULES = [
+    'requests',
+    'requests_oauthlib',
+    'sqlite3',
+    'pytoml',
+    'colorlog'
+]
+
+
+def import_times(argv, env):
+    """ Run agilebot with `python -X importtime` and parse the report.
+
+    :return: `{module: cumulative microseconds}` for every module imported
+    :rtype: dict
+    """
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'agilebot.cmd'] + argv,
+        cwd=ROOT_PATH,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True
+    )
+    if proc.returncode != 0:
+        raise AssertionError('agilebot {} failed: {}'.format(' '.join(argv), proc.stderr))
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+class StartupTest(unittest.TestCase):
+
+    def setUp(self):
+        # no config file and no daemon, so nothing but the command itself is loaded
+        self.home = tempfile.TemporaryDirectory()
+        self.env = dict(
+            os.environ,
+            HOME=self.home.name,
+            AB_BASE_PATH=os.path.join(self.home.name, '.agilebot.d'),
+            AGILEBOT_NO_DAEMON='1'
+        )
+
+    def tearDown(self):
+        self.home.cleanup()
+
+    def test_render_name_skips_network_stack(self):
+        times = import_times(['sprint', 'render-name'], self.env)
+        loaded = [
+            m for m in times
+            if any(m == n or m.startswith(n + '.') for n in NETWORK_MODULES)
+        ]
+        self.assertEqual(loaded, [], 'sprint render-name imported {} ({}us for agilebot.cmd)'.format(
+            loaded, times.get('agilebot.cmd')))
+
+
+if __name__ == '__main__':
+    unittest.main()